@@ -0,0 +1,132 @@
+"""
+Compara a normalização antiga (apply + iterrows sobre o DataFrame inteiro)
+com o `Normalizador` de passada única de `scripts/normalizacao.py`.
+
+Uso: python benchmarks/bench_normalizacao.py [quantidade ...]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from gerador_sintetico import gera_projetos
+from normalizacao import Normalizador
+
+# Colunas de `operacoes` no caminho antigo
+COLUNAS_LEGADO = [
+    'id_operacao', 'valor_investimento_previsto', 'tomador_nome', 'tomador_codigo',
+    'executor_nome', 'executor_codigo', 'repassador_nome', 'repassador_codigo',
+    'origem_fontes_de_recurso'
+]
+
+
+def normaliza_legado(dados):
+    """Caminho original de `processa_dados.py`, mantido aqui como referência."""
+    df = pd.DataFrame(dados)
+
+    df['tomadorNome'] = df['tomadores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
+    df['tomadorCodigo'] = df['tomadores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
+    df['executorNome'] = df['executores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
+    df['executorCodigo'] = df['executores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
+    df['repassadorNome'] = df['repassadores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
+    df['repassadorCodigo'] = df['repassadores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
+    df['origemFontesDeRecurso'] = df['fontesDeRecurso'].apply(lambda x: x[0]['origem'] if len(x) > 0 else None)
+    df['valorInvestimentoPrevisto'] = df['fontesDeRecurso'].apply(lambda x: x[0]['valorInvestimentoPrevisto'] if len(x) > 0 else None)
+
+    df_principal = df.drop(columns=['tomadores', 'executores', 'repassadores', 'fontesDeRecurso'])
+
+    eixosData, tiposData, subtiposData = [], [], []
+    operacaoEixoRel, operacaoTipoRel, operacaoSubtipoRel = [], [], []
+
+    for index, row in df_principal.iterrows():
+        id_op = row['idUnico']
+        for eixo in row['eixos']:
+            eixosData.append(eixo)
+            operacaoEixoRel.append({'idUnico': id_op, 'id_eixo': eixo['id']})
+        for tipo in row['tipos']:
+            tiposData.append(tipo)
+            operacaoTipoRel.append({'idUnico': id_op, 'id_tipo': tipo['id']})
+        for subtipo in row['subTipos']:
+            subtiposData.append(subtipo)
+            operacaoSubtipoRel.append({'idUnico': id_op, 'id_subtipo': subtipo['id']})
+
+    df_eixos = pd.DataFrame(eixosData).drop_duplicates(subset=['id']).reset_index(drop=True)
+    df_tipos = pd.DataFrame(tiposData).drop_duplicates(subset=['id']).reset_index(drop=True)
+    df_subtipos = pd.DataFrame(subtiposData).drop_duplicates(subset=['id']).reset_index(drop=True)
+    df_operacaoEixoRel = pd.DataFrame(operacaoEixoRel).drop_duplicates().reset_index(drop=True)
+    df_operacaoTipoRel = pd.DataFrame(operacaoTipoRel).drop_duplicates().reset_index(drop=True)
+    df_operacaoSubtipoRel = pd.DataFrame(operacaoSubtipoRel).drop_duplicates().reset_index(drop=True)
+
+    df_principal_final = df_principal.drop(columns=['tipos', 'subTipos', 'eixos'])
+    df_principal_final = df_principal_final.drop_duplicates(subset=['idUnico'], keep='first')
+
+    df_eixos.rename(columns={'id': 'id_eixo', 'descricao': 'descricao_eixo'}, inplace=True)
+    df_tipos.rename(columns={'id': 'id_tipo', 'descricao': 'descricao_tipo', 'idEixo': 'id_eixo'}, inplace=True)
+    df_subtipos.rename(columns={'id': 'id_subtipo', 'descricao': 'descricao_subtipo', 'idTipo': 'id_tipo'}, inplace=True)
+    df_operacaoEixoRel.rename(columns={'idUnico': 'id_operacao'}, inplace=True)
+    df_operacaoTipoRel.rename(columns={'idUnico': 'id_operacao'}, inplace=True)
+    df_operacaoSubtipoRel.rename(columns={'idUnico': 'id_operacao'}, inplace=True)
+    df_principal_final.rename(columns={
+        'idUnico': 'id_operacao',
+        'valorInvestimentoPrevisto': 'valor_investimento_previsto',
+        'tomadorNome': 'tomador_nome',
+        'tomadorCodigo': 'tomador_codigo',
+        'executorNome': 'executor_nome',
+        'executorCodigo': 'executor_codigo',
+        'repassadorNome': 'repassador_nome',
+        'repassadorCodigo': 'repassador_codigo',
+        'origemFontesDeRecurso': 'origem_fontes_de_recurso'
+    }, inplace=True)
+
+    return {
+        'eixos': df_eixos,
+        'tipos': df_tipos,
+        'subtipos': df_subtipos,
+        'operacoes': df_principal_final[COLUNAS_LEGADO],
+        'operacao_eixo_rel': df_operacaoEixoRel,
+        'operacao_tipo_rel': df_operacaoTipoRel,
+        'operacao_subtipo_rel': df_operacaoSubtipoRel,
+    }
+
+
+# O caminho antigo usava apenas a primeira fonte de recurso; hoje o valor é a soma de todas
+COLUNAS_IGNORADAS = {'valor_investimento_previsto'}
+
+
+def mesmas_tabelas(esperado, obtido):
+    """Compara as sete tabelas antigas ignorando ordem das linhas e dtypes."""
+    # As ligações novas apontam para a operação por `sk_operacao`; as antigas, por `id_operacao`
+    id_por_sk = obtido['operacoes'].set_index('sk_operacao')['id_operacao']
+    for nome, df_esperado in esperado.items():
+        df_obtido = obtido[nome]
+        if 'sk_operacao' in df_obtido.columns:
+            df_obtido = df_obtido.assign(id_operacao=df_obtido['sk_operacao'].map(id_por_sk))
+        colunas = [c for c in df_esperado.columns if c not in COLUNAS_IGNORADAS]
+        df_esperado = df_esperado[colunas]
+        a = df_esperado.astype(str).sort_values(colunas).reset_index(drop=True)
+        b = df_obtido[colunas].astype(str).sort_values(colunas).reset_index(drop=True)
+        if not a.equals(b):
+            return False
+    return True
+
+
+def cronometra(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main(quantidades):
+    print(f"{'projetos':>10} {'legado (s)':>12} {'novo (s)':>10} {'speedup':>8}  iguais")
+    for quantidade in quantidades:
+        dados = list(gera_projetos(quantidade))
+        t_legado, esperado = cronometra(normaliza_legado, dados)
+        t_novo, obtido = cronometra(Normalizador(calcular_hash=False).normaliza, dados)
+        print(f"{quantidade:>10} {t_legado:>12.3f} {t_novo:>10.3f} {t_legado / t_novo:>7.1f}x  {mesmas_tabelas(esperado, obtido)}")
+
+
+if __name__ == '__main__':
+    main([int(q) for q in sys.argv[1:]] or [10_000, 50_000])
@@ -0,0 +1,44 @@
+import random
+
+## Gerador de registros sintéticos no formato do endpoint `projeto-investimento`
+
+ORIGENS = ['Federal', 'Estadual', 'Municipal', 'Privado', 'Internacional']
+
+
+def gera_projetos(quantidade, seed=42, num_eixos=8, num_tipos=60, num_subtipos=250, num_orgaos=2000,
+                 ufs=('DF',)):
+    """
+    Gera `quantidade` registros com listas aninhadas de eixos, tipos, subtipos,
+    tomadores, executores, repassadores e fontes de recurso. Com mais de uma
+    UF em `ufs`, cada projeto recebe uma delas ao acaso.
+    """
+    rnd = random.Random(seed)
+
+    eixos = [{'id': i, 'descricao': f'Eixo {i}'} for i in range(1, num_eixos + 1)]
+    tipos = [{'id': i, 'descricao': f'Tipo {i}', 'idEixo': rnd.randint(1, num_eixos)}
+             for i in range(1, num_tipos + 1)]
+    subtipos = [{'id': i, 'descricao': f'Subtipo {i}', 'idTipo': rnd.randint(1, num_tipos)}
+                for i in range(1, num_subtipos + 1)]
+    orgaos = [{'nome': f'ORGAO PUBLICO {i}', 'codigo': 100000 + i} for i in range(num_orgaos)]
+
+    def amostra(lista, minimo, maximo):
+        return [dict(item) for item in rnd.sample(lista, rnd.randint(minimo, maximo))]
+
+    for i in range(quantidade):
+        tipos_projeto = amostra(tipos, 0, 2)
+        yield {
+            'idUnico': f'{i}.{rnd.randint(10, 99)}-{rnd.randint(10, 99)}',
+            'nome': f'Projeto sintético {i}',
+            'uf': ufs[0] if len(ufs) == 1 else rnd.choice(ufs),
+            'natureza': rnd.choice(['Obra', 'Projeto', 'Estudo', 'Outros']),
+            'eixos': [dict(eixos[t['idEixo'] - 1]) for t in tipos_projeto] or amostra(eixos, 0, 1),
+            'tipos': tipos_projeto,
+            'subTipos': amostra(subtipos, 0, 3),
+            'tomadores': amostra(orgaos, 0, 2),
+            'executores': amostra(orgaos, 0, 2),
+            'repassadores': amostra(orgaos, 0, 1),
+            'fontesDeRecurso': [
+                {'origem': rnd.choice(ORIGENS), 'valorInvestimentoPrevisto': round(rnd.uniform(1e4, 5e7), 2)}
+                for _ in range(rnd.randint(0, 3))
+            ],
+        }
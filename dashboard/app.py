@@ -1,10 +1,32 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError, ProgrammingError
+import os
+import sys
 import time
 import altair as alt
 
+# Conexão (scripts/banco.py) e consultas filtradas (scripts/resumos.py) são as mesmas do ETL
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from banco import conectar
+from cache_versionado import CacheVersionado, ler_ultima_execucao
+from metricas import medir_cache, metricas
+from explorador import FORMATOS_EXPORTACAO, ORDENACOES, Exportacao, buscar_pagina
+from consultas import (carregar_agregados_filtrados, carregar_opcoes_filtros, carregar_operacoes,
+                       carregar_operacoes_staging, ler_resumos, series_graficos)
+
+# Origem da tabela completa: 'mysql' ou 'staging' (Parquet gerado pelo ETL, ver scripts/staging.py)
+FONTE_DADOS = os.environ.get('DASHBOARD_FONTE_DADOS', 'mysql')
+STAGING_DIR = os.environ.get('ETL_STAGING_DIR', 'staging')
+
+# Painel com os tempos de cada fase (também ativado por ?debug=1 na URL)
+DEBUG = os.environ.get('DASHBOARD_DEBUG', '0') == '1'
+
+# Tempos e contadores de cache vão para o log/Prometheus (ver metricas.py)
+inicio_execucao = time.perf_counter()
+metricas.iniciar_endpoint()
+
 # --- Configurações da Página ---
 st.set_page_config(
     page_title="Dashboard ObrasGov",
@@ -13,79 +35,56 @@ st.set_page_config(
 )
 
 # --- Conexão com o Banco de Dados ---
-@st.cache_resource
+@medir_cache('engine', st.cache_resource)
+def _engine():
+    # Uma engine (e um pool de conexões) por processo, compartilhada pelas sessões.
+    # Falhas levantam exceção e por isso não ficam guardadas no cache.
+    # O tempo inclui as novas tentativas enquanto o banco não responde.
+    with metricas.medir('conexao'):
+        return conectar()
+
+@metricas.medido('get_connection')
 def get_connection():
-    retries = 10
-    
-    db_user = "root"
-    db_password = "root" # Sua senha do docker-compose
-    db_host = "db"
-    db_name = "dados_governo"
-    db_port = 3306
-    
-    server_engine_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}"
-    
-    for i in range(retries):
-        try:
-            temp_engine = create_engine(server_engine_url)
-            with temp_engine.connect() as conn:
-                conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {db_name}"))
-                conn.commit()
-            temp_engine.dispose()
-            
-            engine_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-            engine = create_engine(engine_url)
-            
-            with engine.connect() as conn:
-                pass
-            
-            return engine, "success"
+    try:
+        return _engine(), "success"
+    except OperationalError:
+        return None, "connection_error"
+    except Exception as e:
+        st.error(f"Erro inesperado na conexão: {e}")
+        return None, "connection_error"
 
-        except OperationalError:
-            if i < retries - 1:
-                time.sleep(3) 
-            else:
-                return None, "connection_error"
-        except Exception as e:
-            st.error(f"Erro inesperado na conexão: {e}")
-            return None, "connection_error"
+# --- Cache de resultados ---
+@medir_cache('cache_versionado', st.cache_resource)
+def get_cache(_engine):
+    """
+    Um único cache por processo, compartilhado entre as sessões. Os resultados
+    valem até o ETL publicar uma nova versão em `etl_runs` (ver
+    `cache_versionado.py`) e ficam em Parquet para sobreviver a reinícios.
+    """
+    return CacheVersionado(_engine)
 
 # --- Carregamento dos Dados ---
-@st.cache_data(ttl=600)
 def load_data():
+    """
+    Tabela completa de operações com dtypes compactos (categorias e rótulos de
+    eixo/tipo codificados, ver `consultas.compactar_operacoes`). É o mesmo
+    objeto para todas as sessões. Usada no modo staging: lê os Parquet do ETL
+    e, se o staging não tem todas as operações (carga incremental) ou é de
+    outra versão, lê do banco.
+    """
     try:
         engine, conn_status = get_connection()
 
         if conn_status != "success":
             return None, "connection_error_from_load"
 
-        query = """
-        SELECT 
-            op.id_operacao,
-            op.valor_investimento_previsto,
-            op.tomador_nome,
-            op.origem_fontes_de_recurso,
-            GROUP_CONCAT(DISTINCT ex.descricao_eixo SEPARATOR ', ') AS eixo_descricao,
-            GROUP_CONCAT(DISTINCT tp.descricao_tipo SEPARATOR ', ') AS tipo_descricao
-        FROM operacoes op
-        LEFT JOIN operacao_eixo_rel oe ON op.id_operacao = oe.id_operacao
-        LEFT JOIN eixos ex ON oe.id_eixo = ex.id_eixo
-        LEFT JOIN operacao_tipo_rel otr ON op.id_operacao = otr.id_operacao
-        LEFT JOIN tipos tp ON otr.id_tipo = tp.id_tipo
-        GROUP BY 
-            op.id_operacao,
-            op.valor_investimento_previsto,
-            op.tomador_nome,
-            op.origem_fontes_de_recurso;
-        """
-        df = pd.read_sql(query, engine)
-        
-        # Limpeza pós-query: preencher valores nulos para gráficos
-        df['eixo_descricao'] = df['eixo_descricao'].fillna('Não Categorizado')
-        df['tipo_descricao'] = df['tipo_descricao'].fillna('Não Categorizado')
-        df['origem_fontes_de_recurso'] = df['origem_fontes_de_recurso'].fillna('Não Informada')
-        
-        if df.empty:
+        def carregar():
+            df = carregar_operacoes_staging(STAGING_DIR, engine.dialect.name)
+            return df if df is not None else carregar_operacoes(engine)
+
+        df = get_cache(engine).obter('operacoes', carregar)
+
+        if df is None or df.empty:
             return None, "no_data"
             
         return df, "success"
@@ -96,6 +95,173 @@ def load_data():
         st.error(f"Erro inesperado ao carregar dados: {e}")
         return None, "other_error"
 
+def load_resumos():
+    """
+    Lê as tabelas de resumo que o ETL recalcula a cada carga (ver
+    `scripts/resumos.py`): poucas centenas de linhas, independente do
+    tamanho da tabela de operações.
+    """
+    try:
+        engine, conn_status = get_connection()
+
+        if conn_status != "success":
+            return None, "connection_error_from_load"
+
+        resumos = get_cache(engine).obter('resumos', lambda: ler_resumos(engine))
+
+        if resumos['kpis'].empty or not resumos['kpis'].loc[0, 'num_operacoes']:
+            return None, "no_data"
+
+        return resumos, "success"
+
+    except ProgrammingError:
+        return None, "table_not_found"
+    except Exception as e:
+        st.error(f"Erro inesperado ao carregar resumos: {e}")
+        return None, "other_error"
+
+def load_opcoes_filtros():
+    """Listas de eixos, tipos, origens e tomadores para a barra lateral."""
+    engine, conn_status = get_connection()
+    if conn_status != "success":
+        return None
+    try:
+        return get_cache(engine).obter('opcoes_filtros', lambda: carregar_opcoes_filtros(engine))
+    except ProgrammingError:
+        return None
+
+def load_resumos_filtrados(ufs, eixos, tipos, origens, tomadores, valor_min, valor_max):
+    """
+    Mesmo formato de `load_resumos`, agregado no banco só sobre as operações
+    filtradas. A versão dos dados entra na chave do cache junto com os filtros.
+    """
+    try:
+        engine, conn_status = get_connection()
+
+        if conn_status != "success":
+            return None, "connection_error_from_load"
+
+        return _resumos_filtrados(get_cache(engine).versao(), ufs, eixos, tipos, origens, tomadores, valor_min, valor_max)
+
+    except ProgrammingError:
+        return None, "table_not_found"
+    except Exception as e:
+        st.error(f"Erro inesperado ao carregar dados filtrados: {e}")
+        return None, "other_error"
+
+@medir_cache('resumos_filtrados', st.cache_data(max_entries=256))
+def _resumos_filtrados(versao, ufs, eixos, tipos, origens, tomadores, valor_min, valor_max):
+    engine, _ = get_connection()
+    resumos = carregar_agregados_filtrados(
+        engine, ufs=ufs, eixos=eixos, tipos=tipos, origens=origens, tomadores=tomadores,
+        valor_min=valor_min, valor_max=valor_max,
+    )
+
+    if not resumos['kpis'].loc[0, 'num_operacoes']:
+        return None, "no_match"
+
+    return resumos, "success"
+
+@medir_cache('ultima_execucao', st.cache_data(max_entries=8))
+def load_ultima_execucao(versao):
+    """Última carga publicada pelo serviço de atualização (muda junto com a versão)."""
+    engine, _ = get_connection()
+    return ler_ultima_execucao(engine)
+
+def filtros_barra_lateral(opcoes):
+    """Desenha os filtros na barra lateral e devolve os ids/valores escolhidos."""
+    st.sidebar.header("Filtros")
+
+    def multiselect(rotulo, df, coluna_id, coluna_nome):
+        nomes = dict(zip(df[coluna_id], df[coluna_nome]))
+        return tuple(st.sidebar.multiselect(rotulo, list(nomes), format_func=nomes.get))
+
+    ufs = tuple(st.sidebar.multiselect("UF", opcoes['ufs']['uf'].tolist()))
+    eixos = multiselect("Eixo", opcoes['eixos'], 'id_eixo', 'descricao_eixo')
+    tipos = multiselect("Tipo", opcoes['tipos'], 'id_tipo', 'descricao_tipo')
+    origens = multiselect("Origem do recurso", opcoes['origens'], 'id_origem', 'descricao_origem')
+    tomadores = multiselect("Tomador", opcoes['tomadores'], 'id_orgao', 'nome')
+
+    valor_min = valor_max = None
+    minimo, maximo = opcoes['valores'].iloc[0]
+    if pd.notna(minimo) and minimo < maximo:
+        faixa = st.sidebar.slider("Valor previsto (R$)", float(minimo), float(maximo), (float(minimo), float(maximo)))
+        if faixa != (float(minimo), float(maximo)):
+            valor_min, valor_max = faixa
+
+    return dict(ufs=ufs, eixos=eixos, tipos=tipos, origens=origens, tomadores=tomadores,
+                valor_min=valor_min, valor_max=valor_max)
+
+@medir_cache('pagina', st.cache_data(max_entries=512))
+def load_pagina(versao, tamanho, ordem, decrescente, busca, cursor, filtros):
+    """Uma página do explorador; a versão dos dados faz parte da chave do cache."""
+    engine, _ = get_connection()
+    return buscar_pagina(engine, tamanho=tamanho, ordem=ordem, decrescente=decrescente,
+                         busca=busca, cursor=cursor, filtros=filtros)
+
+def explorador_operacoes(engine, filtros):
+    """
+    Tabela paginada no banco (paginação por chave em `operacoes`): só a página
+    visível é buscada. A exportação percorre o resultado inteiro em segundo plano.
+    """
+    col_busca, col_ordem, col_direcao, col_tamanho = st.columns([3, 2, 1, 1])
+    busca = col_busca.text_input("Buscar por id ou tomador (início do texto)").strip()
+    ordem = col_ordem.selectbox("Ordenar por", list(ORDENACOES), format_func=ORDENACOES.get)
+    decrescente = col_direcao.toggle("Decrescente")
+    tamanho = col_tamanho.selectbox("Linhas", [25, 50, 100, 500], index=1)
+
+    # Qualquer mudança na consulta volta para a primeira página
+    chave = (busca, ordem, decrescente, tamanho, tuple(sorted(filtros.items())))
+    if st.session_state.get('explorador_chave') != chave:
+        st.session_state.explorador_chave = chave
+        st.session_state.explorador_cursores = [None]
+    cursores = st.session_state.explorador_cursores
+
+    versao = get_cache(engine).versao()
+    df_pagina, proximo = load_pagina(versao, tamanho, ordem, decrescente, busca, cursores[-1], filtros)
+    with metricas.medir('render', componente='explorador'):
+        st.dataframe(df_pagina, hide_index=True, use_container_width=True)
+
+    col_anterior, col_pagina, col_proxima = st.columns([1, 4, 1])
+    col_anterior.button("◀ Anterior", disabled=len(cursores) == 1, on_click=cursores.pop)
+    col_pagina.caption(f"Página {len(cursores)}")
+    col_proxima.button("Próxima ▶", disabled=proximo is None, on_click=cursores.append, args=(proximo,))
+
+    col_formato, col_exportar = st.columns([1, 3])
+    formato = col_formato.selectbox("Formato", FORMATOS_EXPORTACAO)
+    if col_exportar.button("Exportar resultado completo"):
+        st.session_state.exportacao = Exportacao(engine, formato=formato, ordem=ordem, decrescente=decrescente,
+                                                 busca=busca, filtros=filtros)
+
+    exportacao = st.session_state.get('exportacao')
+    if exportacao is None:
+        return
+    if exportacao.em_andamento:
+        st.info(f"Exportando em segundo plano... {exportacao.linhas} linhas até agora.")
+        st.button("Atualizar status da exportação")
+    elif exportacao.status == 'erro':
+        st.error(f"Falha na exportação: {exportacao.erro}")
+    elif not exportacao.linhas:
+        st.warning("Nenhuma operação para exportar.")
+    else:
+        with open(exportacao.caminho, 'rb') as arquivo:
+            st.download_button(f"Baixar {os.path.basename(exportacao.caminho)} ({exportacao.linhas} linhas)",
+                               arquivo, file_name=os.path.basename(exportacao.caminho))
+
+def painel_depuracao():
+    """
+    Tempos das fases (conexão, SQL, pandas, renderização) e acertos dos caches,
+    acumulados pelo processo. A renderização medida é a do servidor (montar e
+    enviar o gráfico), não o desenho no navegador.
+    """
+    with st.sidebar.expander("Depuração: tempos e caches", expanded=True):
+        st.caption("Por fase (desde o início do processo)")
+        st.dataframe(metricas.resumo_tempos(), hide_index=True)
+        st.caption("Caches")
+        st.dataframe(metricas.resumo_caches())
+        st.caption("Últimas medições")
+        st.dataframe(metricas.ultimas(30), hide_index=True)
+
 # --- FUNÇÃO PRINCIPAL DO DASHBOARD (COM NOVOS GRÁFICOS) ---
 
 # 1. Título e Descrição
@@ -121,19 +287,34 @@ if st.session_state.show_data:
             st.error("Falha ao conectar ao banco de dados. Verifique os contêineres.", icon="🔥")
             st.stop() 
 
-        df, data_status = load_data()
+        # O ETL roda no serviço `etl` (scripts/atualizador.py): o dashboard mostra os últimos dados publicados
+        ultima_execucao = load_ultima_execucao(get_cache(engine).versao())
+        if ultima_execucao:
+            st.caption(f"Dados atualizados em {ultima_execucao['concluida_em']:%d/%m/%Y %H:%M} "
+                       f"({ultima_execucao['num_operacoes']} operações na última carga).")
+
+        resumos, data_status = load_resumos()
+
+        # Com algum filtro ativo, os agregados são recalculados no banco (sem ler tudo para o pandas)
+        opcoes = load_opcoes_filtros() if data_status == "success" else None
+        filtros = {}
+        if opcoes is not None:
+            filtros = filtros_barra_lateral(opcoes)
+            if any(valor not in (None, ()) for valor in filtros.values()):
+                resumos, data_status = load_resumos_filtrados(**filtros)
 
         if data_status == "success":
             st.success("Dados carregados com sucesso!")
             
             # --- VISUALIZAÇÃO 1: MÉTRICAS (KPIs) ---
             st.subheader("Métricas Principais")
-            total_valor = df['valor_investimento_previsto'].sum()
-            num_operacoes = len(df)
-            media_valor = df['valor_investimento_previsto'].mean()
-            num_eixos = df['eixo_descricao'].nunique()
-            num_tipos = df['tipo_descricao'].nunique()
-            num_origens = df['origem_fontes_de_recurso'].nunique()
+            kpis = resumos['kpis'].iloc[0]
+            total_valor = kpis['valor_total']
+            num_operacoes = int(kpis['num_operacoes'])
+            media_valor = kpis['valor_medio'] or 0
+            num_eixos = int(kpis['num_eixos'])
+            num_tipos = int(kpis['num_tipos'])
+            num_origens = int(kpis['num_origens'])
 
             col1, col2, col3, col4, col5= st.columns(5)
             col1.metric("Valor Total Previsto", f"R$ {total_valor:,.2f}")
@@ -147,12 +328,13 @@ if st.session_state.show_data:
             
             # --- GRÁFICOS (Layout 2x2) ---
             st.subheader("Análise dos Investimentos")
+            graficos = series_graficos(resumos)
             col_graf_1, col_graf_2 = st.columns(2)
 
             with col_graf_1:
                 # --- VISUALIZAÇÃO 2: Valor por Tipo/Espécie (Gráfico de Pizza) ---
                 st.markdown("#### Valor por Tipo (Espécie)")
-                df_tipo = df.groupby('tipo_descricao')['valor_investimento_previsto'].sum().reset_index()
+                df_tipo = graficos['tipos']
                 
                 # Gráfico de pizza
                 base = alt.Chart(df_tipo).encode(
@@ -163,13 +345,15 @@ if st.session_state.show_data:
                     order=alt.Order("valor_investimento_previsto", sort="descending"),
                     tooltip=["tipo_descricao", "valor_investimento_previsto"]
                 )
-                st.altair_chart(pie, use_container_width=True)
+                with metricas.medir('render', componente='grafico_tipos'):
+                    st.altair_chart(pie, use_container_width=True)
 
             with col_graf_2:
                 # --- VISUALIZAÇÃO 3: Valor por Eixo (Gráfico de Barras) ---
                 st.markdown("#### Valor por Eixo")
-                df_eixo_valor = df.groupby('eixo_descricao')['valor_investimento_previsto'].sum().sort_values(ascending=False)
-                st.bar_chart(df_eixo_valor)
+                df_eixo_valor = graficos['eixo_valor']
+                with metricas.medir('render', componente='grafico_eixo_valor'):
+                    st.bar_chart(df_eixo_valor)
 
             
             st.markdown("<br>", unsafe_allow_html=True) # Adiciona um espaço
@@ -178,33 +362,53 @@ if st.session_state.show_data:
             with col_graf_3:
                 # --- VISUALIZAÇÃO 4: Top 10 Tomadores por Valor (Barras Horizontais) ---
                 st.markdown("#### Top 10 Tomadores de Recurso")
-                df_top_tomadores = df.groupby('tomador_nome')['valor_investimento_previsto'].sum().nlargest(10).sort_values(ascending=True)
-                st.bar_chart(df_top_tomadores, horizontal=True)
+                df_top_tomadores = graficos['top_tomadores']
+                with metricas.medir('render', componente='grafico_top_tomadores'):
+                    st.bar_chart(df_top_tomadores, horizontal=True)
 
             with col_graf_4:
                 # --- VISUALIZAÇÃO 5: Contagem de Operações por Eixo (Barras) ---
                 st.markdown("#### Contagem de Operações por Eixo")
-                df_eixo_contagem = df['eixo_descricao'].value_counts().sort_values(ascending=False)
-                st.bar_chart(df_eixo_contagem)
+                df_eixo_contagem = graficos['eixo_contagem']
+                with metricas.medir('render', componente='grafico_eixo_contagem'):
+                    st.bar_chart(df_eixo_contagem)
 
             st.markdown("---")
 
             # --- VISUALIZAÇÃO 6: Tabela de Dados Interativa ---
             st.subheader("Explore os Dados Completos")
-            st.dataframe(df)
+            if FONTE_DADOS == 'staging':
+                # Sem paginação no banco: a tabela compacta vem inteira (do Parquet, ver `load_data`), sob demanda
+                st.caption("A tabela completa não aplica os filtros da barra lateral.")
+                if st.toggle("Carregar tabela completa"):
+                    df, df_status = load_data()
+                    if df_status == "success":
+                        with metricas.medir('render', componente='tabela_completa'):
+                            st.dataframe(df)
+            else:
+                explorador_operacoes(engine, filtros)
 
         # --- Lógica de Erro (sem alterações) ---
+        elif data_status == "no_match":
+            st.warning("Nenhuma operação atende aos filtros selecionados.", icon="🔎")
+
         elif data_status == "no_data":
             st.warning("Banco de dados conectado, mas as tabelas estão vazias.", icon="📊")
-            st.info("Execute o script de ETL para popular o banco de dados:")
-            st.code("docker compose exec app python scripts/processa_dados.py", language="bash")
+            st.info("A primeira carga é feita pelo serviço `etl`; para rodá-la manualmente:")
+            st.code("docker compose exec etl python scripts/processa_dados.py", language="bash")
             st.info("Após executar o comando, atualize esta página.")
 
         elif data_status == "table_not_found":
             st.error("Tabelas não encontradas no banco de dados.", icon="🔍")
-            st.info("Execute o script de ETL para criar e popular o banco de dados:")
-            st.code("docker compose exec app python scripts/processa_dados.py", language="bash")
+            st.info("A primeira carga é feita pelo serviço `etl`; para rodá-la manualmente:")
+            st.code("docker compose exec etl python scripts/processa_dados.py", language="bash")
             st.info("Após executar o comando, atualize esta página.")
 
         elif data_status == "connection_error_from_load":
-             st.error("Erro na conexão ao tentar carregar os dados. Verifique os logs.")
\ No newline at end of file
+             st.error("Erro na conexão ao tentar carregar os dados. Verifique os logs.")
+
+# --- Métricas da execução ---
+metricas.registrar('execucao_script', time.perf_counter() - inicio_execucao)
+metricas.gravar_prometheus()
+if DEBUG or st.query_params.get('debug') == '1':
+    painel_depuracao()
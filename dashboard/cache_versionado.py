@@ -0,0 +1,178 @@
+import glob
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+
+from esquema import etl_runs_table
+from metricas import metricas
+
+try:
+    import pyarrow  # noqa: F401  (usado pelo pandas em to_parquet/read_parquet)
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+## Cache de resultados do dashboard, invalidado pela versão publicada pelo ETL
+
+CACHE_DIR = os.environ.get('DASHBOARD_CACHE_DIR', 'dashboard_cache')
+
+# De quantos em quantos segundos a versão é consultada no banco
+INTERVALO_VERSAO = float(os.environ.get('DASHBOARD_INTERVALO_VERSAO', 5))
+
+# Sem `etl_runs` (banco carregado por uma versão antiga do ETL) volta ao TTL fixo
+TTL_SEM_VERSAO = 600
+
+
+def ler_versao(engine):
+    """
+    Maior `id_execucao` concluído de `etl_runs`, ou None se a tabela não
+    existe/está vazia. Uma carga em andamento (`concluida_em` nulo) ainda não é versão.
+    """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(id_execucao) FROM etl_runs WHERE concluida_em IS NOT NULL")).scalar()
+    except DBAPIError:
+        return None
+
+
+def ler_ultima_execucao(engine):
+    """Última carga publicada em `etl_runs` (dict), ou None se ainda não houve nenhuma."""
+    try:
+        with engine.connect() as conn:
+            linha = conn.execute(
+                select(etl_runs_table).where(etl_runs_table.c.concluida_em.isnot(None))
+                .order_by(etl_runs_table.c.id_execucao.desc()).limit(1)
+            ).mappings().first()
+    except DBAPIError:
+        return None
+    return dict(linha) if linha else None
+
+
+class CacheVersionado:
+    """
+    Cache compartilhado por todas as sessões do processo, em dois níveis:
+
+    - memória: {nome: (versão, resultado)}, servido enquanto a versão não muda;
+    - disco: um Parquet por resultado (`<nome>__v<versão>.parquet`), para que um
+      reinício do Streamlit comece com o cache quente.
+
+    Um resultado é um DataFrame ou um dict de DataFrames. Só é recalculado
+    quando o ETL publica uma nova versão em `etl_runs`.
+    """
+
+    def __init__(self, engine, diretorio=CACHE_DIR, intervalo_versao=INTERVALO_VERSAO):
+        self.engine = engine
+        self.diretorio = diretorio
+        self.intervalo_versao = intervalo_versao
+        self.memoria = {}
+        # Uma trava por resultado: só quem pede o mesmo `nome` espera pela carga dele
+        self.travas = {}
+        self.trava = threading.Lock()
+        self._versao = None
+        self._versao_lida_em = 0.0
+        if PARQUET_DISPONIVEL:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def versao(self):
+        """Versão atual dos dados, relida do banco no máximo a cada `intervalo_versao` segundos."""
+        agora = time.monotonic()
+        if agora - self._versao_lida_em >= self.intervalo_versao:
+            versao = ler_versao(self.engine)
+            if versao is not None and versao != self._versao:
+                # Nova versão (ou a primeira lida por este processo): as outras não serão mais lidas
+                self.limpar(manter=str(versao))
+            self._versao = versao
+            self._versao_lida_em = agora
+        if self._versao is None:
+            return f"sem_versao_{int(time.time() // TTL_SEM_VERSAO)}"
+        return str(self._versao)
+
+    def obter(self, nome, carregar):
+        """
+        Devolve o resultado de `nome` para a versão atual: da memória, do disco ou
+        chamando `carregar()`. Se `carregar` devolver None nada é guardado.
+        O mesmo objeto é entregue a todas as sessões: não deve ser alterado.
+        """
+        versao = self.versao()
+        metricas.contar('dashboard_cache_total', cache=nome, resultado='chamada')
+        resultado = self._ler_memoria(nome, versao)
+        if resultado is not None:
+            return resultado
+
+        with self._trava(nome):
+            # Outra sessão pode ter carregado o resultado enquanto esta esperava
+            resultado = self._ler_memoria(nome, versao)
+            if resultado is not None:
+                return resultado
+
+            persistir = PARQUET_DISPONIVEL and not versao.startswith('sem_versao')
+            resultado = self._ler_disco(nome, versao) if persistir else None
+            metricas.contar('dashboard_cache_total', cache=nome, resultado='disco' if resultado is not None else 'miss')
+            if resultado is None:
+                resultado = carregar()
+                if resultado is None:
+                    return None
+                if persistir:
+                    self._gravar_disco(nome, versao, resultado)
+
+            self.memoria[nome] = (versao, resultado)
+            return resultado
+
+    def _ler_memoria(self, nome, versao):
+        em_memoria = self.memoria.get(nome)
+        if em_memoria and em_memoria[0] == versao:
+            metricas.contar('dashboard_cache_total', cache=nome, resultado='memoria')
+            return em_memoria[1]
+        return None
+
+    def _trava(self, nome):
+        with self.trava:
+            return self.travas.setdefault(nome, threading.Lock())
+
+    def limpar(self, manter=None):
+        """
+        Descarta da memória e do disco os resultados de versões diferentes de
+        `manter` (todos, sem `manter`). Chamado a cada nova versão lida do banco.
+        """
+        with self.trava:
+            for nome in [nome for nome, (versao, _) in self.memoria.items() if versao != manter]:
+                del self.memoria[nome]
+            for caminho in glob.glob(os.path.join(self.diretorio, '*.parquet')):
+                # `<nome>__v<versão>.parquet` ou `<nome>__v<versão>.<chave>.parquet`
+                if manter is None or os.path.basename(caminho).rsplit('__v', 1)[-1].split('.')[0] != manter:
+                    try:
+                        os.remove(caminho)
+                    except FileNotFoundError:
+                        pass
+
+    # --- Nível em disco ---
+
+    def _prefixo(self, nome, versao):
+        return os.path.join(self.diretorio, f"{nome}__v{versao}")
+
+    def _ler_disco(self, nome, versao):
+        prefixo = self._prefixo(nome, versao)
+        if os.path.exists(f"{prefixo}.parquet"):
+            return pd.read_parquet(f"{prefixo}.parquet")
+        # dict de DataFrames: um arquivo `<prefixo>.<chave>.parquet` por item
+        partes = glob.glob(f"{prefixo}.*.parquet")
+        if not partes:
+            return None
+        return {os.path.basename(p)[:-len('.parquet')].split('.')[-1]: pd.read_parquet(p) for p in sorted(partes)}
+
+    def _gravar_disco(self, nome, versao, resultado):
+        # Versões anteriores deste resultado não serão mais lidas
+        for caminho in glob.glob(os.path.join(self.diretorio, f"{nome}__v*")):
+            os.remove(caminho)
+
+        prefixo = self._prefixo(nome, versao)
+        partes = resultado.items() if isinstance(resultado, dict) else [(None, resultado)]
+        for chave, df in partes:
+            destino = f"{prefixo}.parquet" if chave is None else f"{prefixo}.{chave}.parquet"
+            temporario = destino + '.tmp'
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, destino)
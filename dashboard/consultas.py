@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import bindparam, text
+
+from metricas import metricas
+from resumos import SEPARADOR_ROTULOS, chave_rotulos, sql_base_operacoes
+from staging import Staging
+
+## Consultas agregadas com filtros (executadas no MySQL, nunca em pandas)
+
+# Colunas de valor que chegam como DECIMAL e precisam virar float para os gráficos
+COLUNAS_VALOR = ('valor_investimento_previsto', 'valor_total', 'valor_medio')
+
+
+def montar_filtro(ufs=(), eixos=(), tipos=(), origens=(), tomadores=(), valor_min=None, valor_max=None):
+    """
+    Monta a condição SQL sobre `operacoes op` e os parâmetros correspondentes.
+    Listas vazias não filtram. Os filtros por eixo/tipo/origem/tomador usam
+    EXISTS nas tabelas de ligação (atendidos pelos índices secundários).
+    """
+    condicoes = []
+    params = {}
+    expansiveis = []
+
+    if ufs:
+        condicoes.append("op.uf IN :ufs")
+        params['ufs'] = list(ufs)
+        expansiveis.append('ufs')
+    if eixos:
+        condicoes.append("EXISTS (SELECT 1 FROM operacao_eixo_rel f_e "
+                         "WHERE f_e.sk_operacao = op.sk_operacao AND f_e.id_eixo IN :eixos)")
+        params['eixos'] = list(eixos)
+        expansiveis.append('eixos')
+    if tipos:
+        condicoes.append("EXISTS (SELECT 1 FROM operacao_tipo_rel f_t "
+                         "WHERE f_t.sk_operacao = op.sk_operacao AND f_t.id_tipo IN :tipos)")
+        params['tipos'] = list(tipos)
+        expansiveis.append('tipos')
+    if origens:
+        condicoes.append("EXISTS (SELECT 1 FROM operacao_fonte_rel f_o "
+                         "WHERE f_o.sk_operacao = op.sk_operacao AND f_o.id_origem IN :origens)")
+        params['origens'] = list(origens)
+        expansiveis.append('origens')
+    if tomadores:
+        condicoes.append("EXISTS (SELECT 1 FROM operacao_tomador_rel f_tm "
+                         "WHERE f_tm.sk_operacao = op.sk_operacao AND f_tm.id_orgao IN :tomadores)")
+        params['tomadores'] = list(tomadores)
+        expansiveis.append('tomadores')
+    if valor_min is not None:
+        condicoes.append("op.valor_investimento_previsto >= :valor_min")
+        params['valor_min'] = valor_min
+    if valor_max is not None:
+        condicoes.append("op.valor_investimento_previsto <= :valor_max")
+        params['valor_max'] = valor_max
+
+    return " AND ".join(condicoes), params, expansiveis
+
+
+def preparar_consulta(sql, expansiveis):
+    """`text(sql)` com os parâmetros de lista (IN) de `montar_filtro` expandidos."""
+    return text(sql).bindparams(*[bindparam(nome, expanding=True) for nome in expansiveis])
+
+
+def floats(df):
+    """Converte as colunas de `COLUNAS_VALOR` (DECIMAL) para float."""
+    for coluna in COLUNAS_VALOR:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype(float)
+    return df
+
+
+@metricas.medido('sql', consulta='resumos')
+def ler_resumos(engine):
+    """Tabelas de resumo que o ETL recalcula a cada carga (ver `scripts/resumos.py`)."""
+    resumos = {
+        'kpis': pd.read_sql("SELECT * FROM resumo_kpis", engine),
+        'eixos': pd.read_sql("SELECT eixo_descricao, valor_investimento_previsto, num_operacoes FROM resumo_eixos", engine),
+        'tipos': pd.read_sql("SELECT tipo_descricao, valor_investimento_previsto FROM resumo_tipos", engine),
+        'top_tomadores': pd.read_sql(
+            "SELECT tomador_nome, valor_investimento_previsto FROM resumo_top_tomadores "
+            "ORDER BY valor_investimento_previsto DESC LIMIT 10", engine),
+    }
+    # DECIMAL chega como objeto; os gráficos precisam de float
+    return {nome: floats(df_resumo) for nome, df_resumo in resumos.items()}
+
+
+@metricas.medido('pandas', etapa='series_graficos')
+def series_graficos(resumos):
+    """Séries já ordenadas de cada gráfico do dashboard, a partir dos resumos."""
+    eixos = resumos['eixos'].set_index('eixo_descricao')
+    return {
+        'tipos': resumos['tipos'],
+        'eixo_valor': eixos['valor_investimento_previsto'].sort_values(ascending=False),
+        'top_tomadores': resumos['top_tomadores'].set_index('tomador_nome')['valor_investimento_previsto'].sort_values(ascending=True),
+        'eixo_contagem': eixos['num_operacoes'].sort_values(ascending=False),
+    }
+
+
+@metricas.medido('sql', consulta='opcoes_filtros')
+def carregar_opcoes_filtros(engine):
+    """Valores possíveis de cada filtro da barra lateral."""
+    return {
+        'ufs': pd.read_sql("SELECT DISTINCT uf FROM operacoes WHERE uf IS NOT NULL ORDER BY uf", engine),
+        'eixos': pd.read_sql("SELECT id_eixo, descricao_eixo FROM eixos ORDER BY descricao_eixo", engine),
+        'tipos': pd.read_sql("SELECT id_tipo, descricao_tipo FROM tipos ORDER BY descricao_tipo", engine),
+        'origens': pd.read_sql("SELECT id_origem, descricao_origem FROM origens_recurso ORDER BY descricao_origem", engine),
+        'tomadores': pd.read_sql(
+            "SELECT org.id_orgao, org.nome FROM orgaos org "
+            "WHERE EXISTS (SELECT 1 FROM operacao_tomador_rel otr WHERE otr.id_orgao = org.id_orgao) "
+            "ORDER BY org.nome", engine),
+        'valores': pd.read_sql(
+            "SELECT MIN(valor_investimento_previsto) AS valor_min, MAX(valor_investimento_previsto) AS valor_max "
+            "FROM operacoes", engine).astype(float),
+    }
+
+
+@metricas.medido('sql', consulta='agregados_filtrados')
+def carregar_agregados_filtrados(engine, **filtros):
+    """
+    Mesmo formato de `load_resumos` (kpis, eixos, tipos, top_tomadores), mas
+    calculado no banco só sobre as operações que atendem aos filtros.
+    """
+    filtro, params, expansiveis = montar_filtro(**filtros)
+    base = sql_base_operacoes(engine.dialect.name, filtro=filtro)
+    where = f"WHERE {filtro}" if filtro else ""
+
+    consultas = {
+        'kpis': f"""
+            SELECT
+                COALESCE(SUM(valor_investimento_previsto), 0) AS valor_total,
+                COUNT(*) AS num_operacoes,
+                AVG(valor_investimento_previsto) AS valor_medio,
+                COUNT(DISTINCT eixo_descricao) AS num_eixos,
+                COUNT(DISTINCT tipo_descricao) AS num_tipos,
+                COUNT(DISTINCT origem_fontes_de_recurso) AS num_origens
+            FROM ({base}) b""",
+        'eixos': f"""
+            SELECT eixo_descricao, COALESCE(SUM(valor_investimento_previsto), 0) AS valor_investimento_previsto,
+                   COUNT(*) AS num_operacoes
+            FROM ({base}) b
+            GROUP BY eixo_descricao""",
+        'tipos': f"""
+            SELECT tipo_descricao, COALESCE(SUM(valor_investimento_previsto), 0) AS valor_investimento_previsto
+            FROM ({base}) b
+            GROUP BY tipo_descricao""",
+        'top_tomadores': f"""
+            SELECT org.nome AS tomador_nome, COALESCE(SUM(op.valor_investimento_previsto), 0) AS valor_investimento_previsto
+            FROM operacao_tomador_rel otr
+            JOIN orgaos org ON otr.id_orgao = org.id_orgao
+            JOIN operacoes op ON otr.sk_operacao = op.sk_operacao
+            {where}
+            GROUP BY org.id_orgao, org.nome
+            ORDER BY valor_investimento_previsto DESC
+            LIMIT 10""",
+    }
+
+    with engine.connect() as conn:
+        return {
+            nome: floats(pd.read_sql(preparar_consulta(sql, expansiveis), conn, params=params))
+            for nome, sql in consultas.items()
+        }
+
+
+## Tabela completa de operações com dtypes compactos
+
+COLUNAS_OPERACOES = ['id_operacao', 'uf', 'valor_investimento_previsto', 'tomador_nome', 'origem_fontes_de_recurso']
+
+# Colunas de texto com poucos valores distintos repetidos em todas as linhas
+COLUNAS_CATEGORICAS = ('uf', 'tomador_nome', 'origem_fontes_de_recurso')
+
+
+def rotulos_multiplos(sks_operacao, ligacoes, descricoes, vazio, dialeto=None):
+    """
+    Coluna categórica com os rótulos (eixos ou tipos) de cada operação, no
+    mesmo texto do GROUP_CONCAT de `resumos.sql_base_operacoes` no `dialeto`
+    (ordem e DISTINCT pela collation do banco, ver `resumos.chave_rotulos`).
+
+    `ligacoes` tem as colunas (sk_operacao, id) e `descricoes` é uma Series
+    id -> descrição. O conjunto de ids de cada operação vira uma máscara de
+    bits (vetorizado, sem agrupar em Python); cada máscara distinta vira uma
+    categoria (ex.: 'Eixo A, Eixo B') e cada linha guarda só o código dela.
+    """
+    codigos_op, operacoes = pd.factorize(ligacoes['sk_operacao'])
+    codigos_id, ids = pd.factorize(ligacoes['id'])
+
+    mascaras = np.zeros((len(operacoes), (len(ids) + 63) // 64), dtype=np.uint64)
+    np.bitwise_or.at(mascaras, (codigos_op, codigos_id // 64),
+                     np.left_shift(np.uint64(1), (codigos_id % 64).astype(np.uint64)))
+    unicas, combinacao_por_op = np.unique(mascaras, axis=0, return_inverse=True)
+
+    # Rótulo de cada combinação, na ordem do GROUP_CONCAT(DISTINCT ... ORDER BY descricao).
+    # Descrições iguais para a collation contam uma vez só (fica a menor, para ser determinístico)
+    chave = chave_rotulos(dialeto)
+    descricoes_ids = ids.map(descricoes)
+    chaves_ids = [chave(nome) if pd.notna(nome) else None for nome in descricoes_ids]
+    rotulos = []
+    for mascara in unicas:
+        bits = np.flatnonzero(np.unpackbits(mascara.view(np.uint8), bitorder='little'))
+        nomes = {}
+        for b in bits:
+            if chaves_ids[b] is not None:
+                nomes[chaves_ids[b]] = min(descricoes_ids[b], nomes.get(chaves_ids[b], descricoes_ids[b]))
+        rotulos.append(SEPARADOR_ROTULOS.join(nomes[c] for c in sorted(nomes)) or vazio)
+    # Combinações diferentes podem ter o mesmo texto (descrições repetidas)
+    codigos_rotulo, categorias = pd.factorize(pd.Index(rotulos + [vazio]))
+
+    # Operações sem ligação (posição -1) caem no último item: o rótulo `vazio`
+    combinacao_por_op = np.append(combinacao_por_op.reshape(-1), len(unicas))
+    combinacao = combinacao_por_op[operacoes.get_indexer(sks_operacao)]
+    return pd.Categorical.from_codes(codigos_rotulo[combinacao], categories=categorias)
+
+
+def compactar_operacoes(operacoes, eixos, tipos, ligacoes_eixo, ligacoes_tipo, dialeto=None):
+    """
+    Monta a tabela completa com dtypes compactos: textos repetidos como
+    `category`, valor como float64, id como string Arrow e eixo/tipo como
+    categorias de combinações de ids (ver `rotulos_multiplos`, com os rótulos
+    como o banco `dialeto` os monta). `operacoes` traz também `sk_operacao`,
+    usado só para casar as ligações.
+    """
+    df = operacoes.drop(columns='sk_operacao')
+    df['id_operacao'] = df['id_operacao'].astype(pd.ArrowDtype(pa.string()))
+    df['valor_investimento_previsto'] = pd.to_numeric(df['valor_investimento_previsto'], errors='coerce').astype('float64')
+    df['origem_fontes_de_recurso'] = df['origem_fontes_de_recurso'].fillna('Não Informada')
+    for coluna in COLUNAS_CATEGORICAS:
+        df[coluna] = df[coluna].astype('category')
+
+    df['eixo_descricao'] = rotulos_multiplos(
+        operacoes['sk_operacao'], ligacoes_eixo.set_axis(['sk_operacao', 'id'], axis=1),
+        eixos.set_index('id_eixo')['descricao_eixo'], 'Não Categorizado', dialeto)
+    df['tipo_descricao'] = rotulos_multiplos(
+        operacoes['sk_operacao'], ligacoes_tipo.set_axis(['sk_operacao', 'id'], axis=1),
+        tipos.set_index('id_tipo')['descricao_tipo'], 'Não Categorizado', dialeto)
+    return df
+
+
+def carregar_operacoes(engine):
+    """
+    Tabela completa do dashboard. Em vez de um GROUP_CONCAT por operação, lê
+    as ligações com eixos/tipos como pares de inteiros e monta os rótulos no
+    cliente (`compactar_operacoes`).
+    """
+    with metricas.medir('sql', consulta='operacoes'), engine.connect() as conn:
+        tabelas = (
+            pd.read_sql(f"SELECT {', '.join(COLUNAS_OPERACOES)}, sk_operacao FROM operacoes", conn),
+            pd.read_sql("SELECT id_eixo, descricao_eixo FROM eixos", conn),
+            pd.read_sql("SELECT id_tipo, descricao_tipo FROM tipos", conn),
+            pd.read_sql("SELECT sk_operacao, id_eixo FROM operacao_eixo_rel", conn),
+            pd.read_sql("SELECT sk_operacao, id_tipo FROM operacao_tipo_rel", conn),
+        )
+    with metricas.medir('pandas', etapa='compactar_operacoes'):
+        return compactar_operacoes(*tabelas, dialeto=engine.dialect.name)
+
+
+@metricas.medido('staging', consulta='operacoes')
+def carregar_operacoes_staging(diretorio, dialeto=None):
+    """
+    Mesmo DataFrame de `carregar_operacoes`, montado direto dos Parquet do
+    staging do ETL (mapeados em memória), sem passar pelo MySQL. Os rótulos
+    seguem os do banco `dialeto` em que o staging é publicado.
+    None se ainda não há staging concluído, se ele é de uma versão anterior do
+    ETL ou se é incremental (só tem as operações alteradas na última carga upsert).
+    """
+    staging = Staging(diretorio)
+    if not staging.formato_atual or staging.incremental:
+        return None
+
+    return compactar_operacoes(
+        staging.ler_tabela('operacoes', COLUNAS_OPERACOES + ['sk_operacao']),
+        staging.ler_tabela('eixos', ['id_eixo', 'descricao_eixo']),
+        staging.ler_tabela('tipos', ['id_tipo', 'descricao_tipo']),
+        staging.ler_tabela('operacao_eixo_rel'),
+        staging.ler_tabela('operacao_tipo_rel'),
+        dialeto=dialeto,
+    )
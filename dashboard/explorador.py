@@ -0,0 +1,181 @@
+import csv
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from consultas import floats, montar_filtro, preparar_consulta
+from metricas import metricas
+from resumos import sql_base_operacoes
+
+## Explorador paginado da tabela de operações (paginação por chave no banco)
+
+# Colunas que podem ordenar a tabela: todas indexadas em `operacoes`
+ORDENACOES = {
+    'id_operacao': 'Id da operação',
+    'valor_investimento_previsto': 'Valor previsto',
+    'uf': 'UF',
+    'tomador_nome': 'Tomador',
+}
+
+# Busca por prefixo (LIKE 'texto%'), atendida pelos índices dessas colunas
+COLUNAS_BUSCA = ('id_operacao', 'tomador_nome')
+
+EXPORT_DIR = os.environ.get('DASHBOARD_EXPORT_DIR', 'exportacoes')
+FORMATOS_EXPORTACAO = ('csv', 'parquet')
+
+# Esquema fixo do Parquet exportado: uma página só com nulos não muda o tipo da coluna
+ESQUEMA_EXPORTACAO = pa.schema([
+    ('id_operacao', pa.string()),
+    ('uf', pa.string()),
+    ('valor_investimento_previsto', pa.float64()),
+    ('tomador_nome', pa.string()),
+    ('origem_fontes_de_recurso', pa.string()),
+    ('eixo_descricao', pa.string()),
+    ('tipo_descricao', pa.string()),
+])
+
+
+def _escapar_like(texto):
+    # '!' como caractere de escape: a barra invertida teria outro sentido nas strings do MySQL
+    return texto.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def _condicao_cursor(coluna, decrescente, cursor):
+    """
+    Condição "depois do cursor" para ORDER BY coluna, id_operacao (mesma direção).
+    Nulos vêm primeiro na ordem crescente e por último na decrescente (MySQL e
+    SQLite), por isso o caso do valor nulo é tratado à parte.
+    """
+    valor, id_operacao = cursor
+    comparar = '<' if decrescente else '>'
+    mesmo_valor = f"op.id_operacao {comparar} :cursor_id"
+    if coluna == 'id_operacao':
+        return mesmo_valor, {'cursor_id': id_operacao}
+    if valor is None:
+        condicao = f"(op.{coluna} IS NULL AND {mesmo_valor})"
+        if not decrescente:
+            condicao = f"({condicao} OR op.{coluna} IS NOT NULL)"
+        return condicao, {'cursor_id': id_operacao}
+    condicao = f"(op.{coluna} {comparar} :cursor_valor OR (op.{coluna} = :cursor_valor AND {mesmo_valor}))"
+    if decrescente:
+        condicao = f"({condicao} OR op.{coluna} IS NULL)"
+    return condicao, {'cursor_valor': valor, 'cursor_id': id_operacao}
+
+
+def montar_consulta(dialeto, ordem='id_operacao', decrescente=False, busca='', cursor=None,
+                    tamanho=None, filtros=None):
+    """
+    SQL (já com bindparams) e parâmetros de uma página do explorador.
+    `cursor` é o (valor da coluna de ordenação, id_operacao) da última linha
+    da página anterior; None começa do início.
+    """
+    if ordem not in ORDENACOES:
+        raise ValueError(f"Ordenação inválida: {ordem}. Use uma de {list(ORDENACOES)}.")
+
+    filtro, params, expansiveis = montar_filtro(**(filtros or {}))
+    condicoes = [filtro] if filtro else []
+
+    if busca:
+        condicoes.append("(" + " OR ".join(f"op.{c} LIKE :busca ESCAPE '!'" for c in COLUNAS_BUSCA) + ")")
+        params['busca'] = _escapar_like(busca) + '%'
+    if cursor is not None:
+        condicao, params_cursor = _condicao_cursor(ordem, decrescente, cursor)
+        condicoes.append(condicao)
+        params.update(params_cursor)
+
+    direcao = 'DESC' if decrescente else 'ASC'
+    ordem_sql = f"op.id_operacao {direcao}" if ordem == 'id_operacao' else f"op.{ordem} {direcao}, op.id_operacao {direcao}"
+    sql = sql_base_operacoes(dialeto, filtro=" AND ".join(condicoes), ordem=ordem_sql, limite=tamanho)
+    return preparar_consulta(sql, expansiveis), params
+
+
+def _proximo_cursor(df, ordem):
+    if df.empty:
+        return None
+    ultima = df.iloc[-1]
+    valor = ultima[ordem]
+    return (None if pd.isna(valor) else valor, ultima['id_operacao'])
+
+
+@metricas.medido('sql', consulta='pagina_explorador')
+def buscar_pagina(engine, tamanho=50, ordem='id_operacao', decrescente=False, busca='', cursor=None, filtros=None):
+    """
+    Busca só uma página (`tamanho` linhas) a partir de `cursor`.
+    Retorna (DataFrame, cursor da próxima página ou None se esta foi a última).
+    """
+    sql, params = montar_consulta(engine.dialect.name, ordem, decrescente, busca, cursor, tamanho + 1, filtros)
+    with engine.connect() as conn:
+        df = floats(pd.read_sql(sql, conn, params=params))
+    # Uma linha a mais só para saber se existe próxima página
+    tem_proxima = len(df) > tamanho
+    df = df.iloc[:tamanho]
+    return df, (_proximo_cursor(df, ordem) if tem_proxima else None)
+
+
+def iter_paginas(engine, tamanho=5000, **consulta):
+    """Percorre todo o resultado página a página (usado pela exportação)."""
+    cursor = None
+    while True:
+        df, cursor = buscar_pagina(engine, tamanho=tamanho, cursor=cursor, **consulta)
+        if not df.empty:
+            yield df
+        if cursor is None:
+            return
+
+
+class Exportacao:
+    """
+    Exporta o resultado inteiro do explorador para CSV ou Parquet numa thread
+    em segundo plano, página a página (nunca com tudo em memória).
+    `status` vai de 'em_andamento' para 'concluida' ou 'erro'.
+    """
+
+    def __init__(self, engine, formato='csv', diretorio=EXPORT_DIR, **consulta):
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato inválido: {formato}. Use um de {FORMATOS_EXPORTACAO}.")
+        os.makedirs(diretorio, exist_ok=True)
+        self.engine = engine
+        self.formato = formato
+        self.consulta = consulta
+        self.caminho = os.path.join(diretorio, f"operacoes_{time.strftime('%Y%m%d_%H%M%S')}.{formato}")
+        self.linhas = 0
+        self.status = 'em_andamento'
+        self.erro = None
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        temporario = self.caminho + '.tmp'
+        escritor = None
+        try:
+            for numero, df in enumerate(iter_paginas(self.engine, **self.consulta)):
+                if self.formato == 'csv':
+                    df.to_csv(temporario, mode='w' if numero == 0 else 'a', header=numero == 0,
+                              index=False, quoting=csv.QUOTE_MINIMAL)
+                else:
+                    if escritor is None:
+                        escritor = pq.ParquetWriter(temporario, ESQUEMA_EXPORTACAO)
+                    escritor.write_table(pa.Table.from_pandas(df, schema=ESQUEMA_EXPORTACAO, preserve_index=False))
+                self.linhas += len(df)
+            if escritor is not None:
+                escritor.close()
+                escritor = None
+            if self.linhas:
+                os.replace(temporario, self.caminho)
+            self.status = 'concluida'
+        except Exception as e:
+            self.erro = str(e)
+            self.status = 'erro'
+        finally:
+            if escritor is not None:
+                escritor.close()
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    @property
+    def em_andamento(self):
+        return self.status == 'em_andamento'
@@ -0,0 +1,233 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+
+## Tempos e contadores do dashboard: log estruturado, texto no formato do Prometheus e painel de depuração
+
+# Log em JSON (uma linha por medição); vazio desliga
+LOG_METRICAS = os.environ.get('DASHBOARD_METRICAS_LOG', os.path.join('metricas', 'dashboard.jsonl'))
+
+# Arquivo com as métricas no formato texto do Prometheus (para o node_exporter
+# textfile collector, por exemplo); vazio desliga
+ARQUIVO_PROMETHEUS = os.environ.get('DASHBOARD_METRICAS_PROM', '')
+
+# Porta de um endpoint HTTP `/metrics` no próprio processo do Streamlit; vazio desliga
+PORTA_PROMETHEUS = os.environ.get('DASHBOARD_METRICAS_PORTA', '')
+
+# Medições mais recentes guardadas para o painel de depuração
+MAX_RECENTES = 200
+
+
+def _chave(nome, rotulos):
+    return (nome, tuple(sorted(rotulos.items())))
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos_prometheus(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+class Metricas:
+    """
+    Registro das medições do processo (compartilhado por todas as sessões).
+
+    - `medir(fase, **rotulos)`: cronometra um bloco (conexão, SQL, pandas,
+      renderização...) e acumula contagem, soma e máximo por fase e rótulos;
+    - `contar(nome, **rotulos)`: contadores, como acertos e faltas de cache.
+
+    Cada medição também vai para o log em JSON.
+    """
+
+    def __init__(self, log=LOG_METRICAS):
+        self.trava = threading.Lock()
+        self.tempos = {}
+        self.contadores = {}
+        self.recentes = deque(maxlen=MAX_RECENTES)
+        self._servidor = None
+        self.logger = logging.getLogger('dashboard.metricas')
+        self.logger.propagate = False
+        if log and not self.logger.handlers:
+            os.makedirs(os.path.dirname(log) or '.', exist_ok=True)
+            handler = RotatingFileHandler(log, maxBytes=10 * 1024 * 1024, backupCount=3, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    def _log(self, evento):
+        if self.logger.handlers:
+            self.logger.info(json.dumps(evento, ensure_ascii=False, default=str))
+
+    @contextmanager
+    def medir(self, fase, **rotulos):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            yield
+        except Exception as e:
+            erro = type(e).__name__
+            raise
+        finally:
+            if erro:
+                rotulos['erro'] = erro
+            self.registrar(fase, time.perf_counter() - inicio, **rotulos)
+
+    def registrar(self, fase, segundos, **rotulos):
+        """Acumula uma medição já feita (para intervalos que não cabem num `with`)."""
+        evento = {'ts': round(time.time(), 3), 'fase': fase, 'segundos': round(segundos, 6), **rotulos}
+        with self.trava:
+            contagem, soma, maximo = self.tempos.get(_chave(fase, rotulos), (0, 0.0, 0.0))
+            self.tempos[_chave(fase, rotulos)] = (contagem + 1, soma + segundos, max(maximo, segundos))
+            self.recentes.append(evento)
+        self._log(evento)
+
+    def medido(self, fase, **rotulos):
+        """Decorador: `medir` em cada chamada da função."""
+        def decorar(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.medir(fase, **rotulos):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorar
+
+    def contar(self, nome, valor=1, **rotulos):
+        with self.trava:
+            chave = _chave(nome, rotulos)
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    # --- Leitura ---
+
+    def resumo_tempos(self):
+        """DataFrame com chamadas, média, máximo e total por fase/rótulos."""
+        with self.trava:
+            itens = list(self.tempos.items())
+        linhas = [
+            {'fase': fase, 'rotulos': ', '.join(f'{k}={v}' for k, v in rotulos), 'chamadas': contagem,
+             'media_ms': round(soma / contagem * 1000, 2), 'max_ms': round(maximo * 1000, 2),
+             'total_s': round(soma, 3)}
+            for (fase, rotulos), (contagem, soma, maximo) in itens
+        ]
+        return pd.DataFrame(linhas, columns=['fase', 'rotulos', 'chamadas', 'media_ms', 'max_ms', 'total_s'])
+
+    def resumo_caches(self):
+        """
+        Chamadas, faltas e acertos de cada cache (ver `medir_cache` e
+        `CacheVersionado`, que separa os acertos em memória e em disco).
+        """
+        with self.trava:
+            itens = [(dict(rotulos), valor) for (nome, rotulos), valor in self.contadores.items()
+                     if nome == 'dashboard_cache_total']
+        df = pd.DataFrame([{**rotulos, 'total': valor} for rotulos, valor in itens],
+                          columns=['cache', 'resultado', 'total'])
+        tabela = df.pivot_table(index='cache', columns='resultado', values='total', aggfunc='sum', fill_value=0)
+        if {'chamada', 'miss'} <= set(tabela.columns):
+            tabela['hit'] = tabela['chamada'] - tabela['miss']
+        return tabela
+
+    def ultimas(self, quantidade=50):
+        with self.trava:
+            return pd.DataFrame(list(self.recentes)[-quantidade:][::-1])
+
+    def prometheus(self):
+        """Métricas no formato texto de exposição do Prometheus."""
+        with self.trava:
+            tempos = list(self.tempos.items())
+            contadores = list(self.contadores.items())
+
+        linhas = [
+            '# HELP dashboard_fase_segundos Tempo gasto em cada fase do dashboard.',
+            '# TYPE dashboard_fase_segundos summary',
+        ]
+        for (fase, rotulos), (contagem, soma, _) in tempos:
+            rotulos_texto = _rotulos_prometheus((('fase', fase),) + rotulos)
+            linhas.append(f'dashboard_fase_segundos_count{rotulos_texto} {contagem}')
+            linhas.append(f'dashboard_fase_segundos_sum{rotulos_texto} {soma:.6f}')
+        linhas += ['# HELP dashboard_fase_segundos_max Maior tempo de cada fase.',
+                   '# TYPE dashboard_fase_segundos_max gauge']
+        for (fase, rotulos), (_, _, maximo) in tempos:
+            linhas.append(f'dashboard_fase_segundos_max{_rotulos_prometheus((("fase", fase),) + rotulos)} {maximo:.6f}')
+
+        for nome in sorted({nome for (nome, _), _ in contadores}):
+            linhas.append(f'# TYPE {nome} counter')
+            for (outro, rotulos), valor in contadores:
+                if outro == nome:
+                    linhas.append(f'{nome}{_rotulos_prometheus(rotulos)} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+    def gravar_prometheus(self, caminho=ARQUIVO_PROMETHEUS):
+        if not caminho:
+            return
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(temporario, caminho)
+
+    def iniciar_endpoint(self, porta=PORTA_PROMETHEUS):
+        """Sobe (uma vez por processo) um servidor HTTP em segundo plano com `/metrics`."""
+        with self.trava:
+            if not porta or self._servidor is not None:
+                return
+            self._servidor = True
+        metricas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                corpo = metricas.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(('0.0.0.0', int(porta)), Handler)
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+
+
+# Uma instância por processo: os módulos importados sobrevivem às reexecuções do script do Streamlit
+metricas = Metricas()
+
+
+def medir_cache(nome, decorador_cache):
+    """
+    Aplica `decorador_cache` (ex.: `st.cache_data(...)`) contando chamadas e
+    faltas: o corpo da função só roda numa falta, então acertos = chamadas -
+    faltas. A função original continua visível (`functools.wraps`) para o
+    Streamlit montar a chave do cache pelo código e pelos argumentos dela.
+    """
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def corpo(*args, **kwargs):
+            metricas.contar('dashboard_cache_total', cache=nome, resultado='miss')
+            return funcao(*args, **kwargs)
+
+        cacheada = decorador_cache(corpo)
+
+        @functools.wraps(funcao)
+        def chamar(*args, **kwargs):
+            metricas.contar('dashboard_cache_total', cache=nome, resultado='chamada')
+            return cacheada(*args, **kwargs)
+
+        chamar.clear = cacheada.clear
+        return chamar
+    return decorar
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache_api import CACHE_DIR, CacheAPI
+from extracao import API_URL, UFS, ExtratorPaginas, TokenBucket, criar_sessao
+
+## Extração de várias UFs em paralelo, com limite de taxa global e cache por UF
+PROGRESSO = 'progresso.json'
+
+
+def diretorio_uf(diretorio, uf):
+    """Partição do cache de uma UF: `<diretorio>/uf=XX`."""
+    return os.path.join(diretorio, f'uf={uf}')
+
+
+def ler_ufs(valor):
+    """Converte 'DF,GO' / 'todas' na lista de UFs, validando cada sigla."""
+    if valor.strip().lower() == 'todas':
+        return list(UFS)
+    ufs = [uf.strip().upper() for uf in valor.split(',') if uf.strip()]
+    invalidas = [uf for uf in ufs if uf not in UFS]
+    if invalidas:
+        raise ValueError(f"UF inválida: {', '.join(invalidas)}. Use siglas de {UFS} ou 'todas'.")
+    return ufs
+
+
+class AgendadorUFs:
+    """
+    Sincroniza o cache de cada UF (ver `cache_api.CacheAPI`) em uma partição
+    própria, com até `max_ufs_paralelas` UFs ao mesmo tempo.
+
+    Todas as UFs dividem o mesmo `TokenBucket` e a mesma sessão HTTP: o limite
+    de requisições é global e um 429 desacelera todo mundo. Cada UF roda na sua
+    thread e uma UF lenta ou com erro não impede as outras de terminar; o
+    estado de cada uma fica em `<diretorio>/progresso.json`.
+    """
+
+    def __init__(self, ufs, diretorio=CACHE_DIR, ttl=None, max_ufs_paralelas=4,
+                 max_concorrencia_por_uf=2, limitador=None, extrator=ExtratorPaginas, parar_apos_iguais=0,
+                 url=API_URL):
+        self.ufs = list(ufs)
+        # Endpoint da API (um servidor de teste, por exemplo)
+        self.url = url
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.max_ufs_paralelas = max_ufs_paralelas
+        self.max_concorrencia_por_uf = max_concorrencia_por_uf
+        self.limitador = limitador or TokenBucket()
+        self.sessao = criar_sessao(max_ufs_paralelas * max_concorrencia_por_uf)
+        self.extrator = extrator
+        # Ver `CacheAPI.sincronizar`
+        self.parar_apos_iguais = parar_apos_iguais
+        self.progresso = {uf: {'status': 'pendente'} for uf in self.ufs}
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def cache(self, uf):
+        return CacheAPI(diretorio_uf(self.diretorio, uf), ttl=self.ttl)
+
+    def _atualizar(self, uf, **estado):
+        with self._lock:
+            self.progresso[uf].update(estado)
+            temporario = os.path.join(self.diretorio, PROGRESSO + '.tmp')
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.progresso, f, indent=2)
+            os.replace(temporario, os.path.join(self.diretorio, PROGRESSO))
+
+    def _sincronizar_uf(self, uf):
+        inicio = time.time()
+        self._atualizar(uf, status='em_andamento', inicio=inicio)
+        cache = self.cache(uf)
+        extrator = self.extrator(uf=uf, url=self.url, max_concorrencia=self.max_concorrencia_por_uf,
+                                 limitador=self.limitador, sessao=self.sessao)
+        baixadas = cache.sincronizar(extrator, parar_apos_iguais=self.parar_apos_iguais)
+        self._atualizar(uf, status='completo' if cache.completo else 'incompleto',
+                        paginas=len(cache.paginas), baixadas=baixadas, alteradas=cache.alteradas,
+                        segundos=round(time.time() - inicio, 1))
+
+    def executar(self):
+        """Sincroniza todas as UFs e devolve o progresso {uf: estado}."""
+        print(f"Extraindo {len(self.ufs)} UF(s), até {self.max_ufs_paralelas} em paralelo...")
+        with ThreadPoolExecutor(max_workers=self.max_ufs_paralelas) as pool:
+            futuros = {pool.submit(self._sincronizar_uf, uf): uf for uf in self.ufs}
+            for futuro in as_completed(futuros):
+                uf = futuros[futuro]
+                try:
+                    futuro.result()
+                except Exception as e:
+                    self._atualizar(uf, status='erro', erro=str(e))
+                print(f"UF {uf}: {self.progresso[uf]['status']} "
+                      f"({self.progresso[uf].get('paginas', 0)} páginas no cache, "
+                      f"{self.progresso[uf].get('alteradas', 0)} alteradas)")
+        return self.progresso
+
+    @property
+    def completo(self):
+        """True se o cache de todas as UFs chegou ao fim e está válido."""
+        return all(self.cache(uf).completo for uf in self.ufs)
+
+    def ufs_completas(self):
+        """UFs cuja extração chegou ao fim com todas as páginas no cache (ver `CacheAPI.extracao_completa`)."""
+        return {uf for uf in self.ufs if self.cache(uf).extracao_completa}
+
+    def assinatura(self):
+        """Combina as assinaturas dos caches das UFs (ver `CacheAPI.assinatura`)."""
+        partes = [(uf, self.cache(uf).assinatura()) for uf in sorted(self.ufs)]
+        return hashlib.md5(json.dumps(partes).encode('utf-8')).hexdigest()
+
+    def iter_paginas(self):
+        """
+        Gera (uf, pagina, hash, registros) de todas as UFs, uma página por vez.
+        O campo `uf` dos registros é preenchido com a UF da partição quando a
+        API não o devolve.
+        """
+        for uf in self.ufs:
+            for pagina, hash_, registros in self.cache(uf).iter_paginas():
+                for registro in registros:
+                    registro.setdefault('uf', uf)
+                yield uf, pagina, hash_, registros
+
+    def iter_registros(self):
+        """Registros de todas as UFs, uma página por vez (ver `iter_paginas`)."""
+        for _, _, _, registros in self.iter_paginas():
+            yield from registros
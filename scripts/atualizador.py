@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from banco import conectar
+from esquema import etl_runs_table
+
+## Serviço de atualização: roda o ETL (processa_dados.py) periodicamente, fora do dashboard
+
+# Intervalo entre cargas, em horas, contado a partir da última carga publicada em `etl_runs`
+INTERVALO_HORAS = float(os.environ.get('ETL_INTERVALO_HORAS', 24))
+
+# Horário fixo do dia ('03:00'); se definido, substitui o intervalo
+HORARIO = os.environ.get('ETL_HORARIO', '')
+
+# Espera antes de tentar de novo quando o ETL falha (API fora do ar, 429...)
+ESPERA_ERRO_MINUTOS = float(os.environ.get('ETL_ESPERA_ERRO_MINUTOS', 30))
+
+# Tempo máximo de uma execução do ETL, em horas; passado disso o processo é encerrado
+TIMEOUT_HORAS = float(os.environ.get('ETL_TIMEOUT_HORAS', 6))
+
+# Argumentos repassados ao processa_dados.py (ex.: '--uf todas')
+ARGUMENTOS_ETL = os.environ.get('ETL_ARGUMENTOS', '').split()
+
+SCRIPT_ETL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processa_dados.py')
+
+
+def ultima_carga(engine):
+    """`concluida_em` da última carga publicada, ou None se ainda não houve nenhuma."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(etl_runs_table.c.concluida_em))).scalar()
+    except DBAPIError:
+        return None
+
+
+def proxima_execucao(ultima, agora=None):
+    """
+    Quando rodar o ETL de novo. Sem carga anterior, imediatamente. Com
+    `ETL_HORARIO`, no próximo horário fixo depois da última carga; senão,
+    `ETL_INTERVALO_HORAS` depois dela. Assim um reinício do contêiner não
+    dispara uma carga se os dados ainda estão em dia (após um reinício vale a
+    última carga que alterou os dados, a última linha de `etl_runs`).
+    """
+    agora = agora or datetime.now()
+    if ultima is None:
+        return agora
+    if HORARIO:
+        hora, minuto = (int(parte) for parte in HORARIO.split(':'))
+        proxima = ultima.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+        if proxima <= ultima:
+            proxima += timedelta(days=1)
+        return proxima
+    return ultima + timedelta(hours=INTERVALO_HORAS)
+
+
+def executar_etl():
+    """
+    Roda o ETL num processo separado: a memória da carga é devolvida ao fim de
+    cada execução e uma falha não derruba o serviço. Uma execução que passa de
+    `ETL_TIMEOUT_HORAS` (ex.: API recusando requisições) é encerrada e conta
+    como falha. Devolve True se concluiu.
+    """
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Iniciando ETL: {' '.join([SCRIPT_ETL] + ARGUMENTOS_ETL)}", flush=True)
+    try:
+        resultado = subprocess.run([sys.executable, SCRIPT_ETL] + ARGUMENTOS_ETL, timeout=TIMEOUT_HORAS * 3600)
+    except subprocess.TimeoutExpired:
+        print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] ETL encerrado após {TIMEOUT_HORAS:g} horas.", flush=True)
+        return False
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] ETL terminou com código {resultado.returncode}.", flush=True)
+    return resultado.returncode == 0
+
+
+def main():
+    try:
+        engine = conectar()
+    except OperationalError as e:
+        print(f"Não foi possível conectar ao banco de dados após várias tentativas: {e}")
+        return 1
+
+    # Uma execução sem alterações não grava uma nova versão em `etl_runs` (os
+    # caches do dashboard continuam valendo): o horário dela fica guardado aqui
+    ultimo_sucesso = None
+    while True:
+        ultima = max((data for data in (ultima_carga(engine), ultimo_sucesso) if data is not None), default=None)
+        proxima = proxima_execucao(ultima)
+        espera = (proxima - datetime.now()).total_seconds()
+        if espera > 0:
+            print(f"Próxima atualização dos dados em {proxima:%Y-%m-%d %H:%M}.", flush=True)
+            time.sleep(espera)
+            continue
+
+        if executar_etl():
+            ultimo_sucesso = datetime.now()
+        else:
+            print(f"Nova tentativa em {ESPERA_ERRO_MINUTOS:g} minutos.", flush=True)
+            time.sleep(ESPERA_ERRO_MINUTOS * 60)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
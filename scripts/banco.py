@@ -0,0 +1,104 @@
+import os
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+## Conexão com o banco, compartilhada pelo ETL e pelo dashboard (configurada por variáveis de ambiente)
+
+# Erro do MySQL para "Unknown database"
+ERRO_BANCO_INEXISTENTE = 1049
+
+
+def configuracao():
+    """Lê as configurações de conexão e do pool do ambiente (padrões do docker-compose)."""
+    return {
+        # URL completa (ex.: sqlite:///dados.db); se definida, ignora usuário/senha/host
+        'url': os.environ.get('DB_URL'),
+        'driver': os.environ.get('DB_DRIVER', 'mysql+mysqlconnector'),
+        'usuario': os.environ.get('DB_USUARIO', 'root'),
+        'senha': os.environ.get('DB_SENHA', 'root'),
+        'host': os.environ.get('DB_HOST', 'db'),
+        'porta': int(os.environ.get('DB_PORTA', 3306)),
+        'nome': os.environ.get('DB_NOME', 'dados_governo'),
+        # Pool: conexões mantidas abertas, extras sob demanda, espera por uma livre
+        'pool_tamanho': int(os.environ.get('DB_POOL_TAMANHO', 5)),
+        'pool_extra': int(os.environ.get('DB_POOL_EXTRA', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Recicla conexões antes do wait_timeout do MySQL (padrão 8h) derrubá-las
+        'pool_reciclar': int(os.environ.get('DB_POOL_RECICLAR', 1800)),
+        'tentativas': int(os.environ.get('DB_TENTATIVAS', 10)),
+        'espera_tentativa': float(os.environ.get('DB_ESPERA_TENTATIVA', 3)),
+    }
+
+
+def url_banco(config, com_banco=True):
+    if config['url']:
+        return make_url(config['url'])
+    return URL.create(
+        config['driver'], username=config['usuario'], password=config['senha'],
+        host=config['host'], port=config['porta'], database=config['nome'] if com_banco else None,
+    )
+
+
+def criar_banco(config):
+    """`CREATE DATABASE IF NOT EXISTS` numa conexão avulsa ao servidor (sem pool)."""
+    servidor = create_engine(url_banco(config, com_banco=False), poolclass=NullPool)
+    try:
+        with servidor.connect() as conn:
+            conn.execute(text(f"CREATE DATABASE IF NOT EXISTS `{config['nome']}`"))
+            conn.commit()
+    finally:
+        servidor.dispose()
+
+
+def criar_engine(config=None, carga_local=False):
+    """
+    Engine com pool de conexões (QueuePool): `pool_pre_ping` testa a conexão
+    antes de entregá-la (descarta as que o servidor fechou) e `pool_recycle`
+    renova as antigas. Com `carga_local=True` habilita o LOAD DATA LOCAL INFILE.
+    """
+    config = config or configuracao()
+    url = url_banco(config)
+    opcoes = {'pool_pre_ping': True}
+    if url.get_backend_name() == 'mysql':
+        opcoes.update(
+            pool_size=config['pool_tamanho'],
+            max_overflow=config['pool_extra'],
+            pool_timeout=config['pool_timeout'],
+            pool_recycle=config['pool_reciclar'],
+        )
+        if carga_local:
+            opcoes['connect_args'] = {'allow_local_infile': True}
+    return create_engine(url, **opcoes)
+
+
+def conectar(config=None, carga_local=False):
+    """
+    Cria a engine e espera o servidor responder, com o mesmo laço de tentativas
+    no ETL e no dashboard. O banco só é criado se o servidor disser que ele
+    não existe. Levanta `OperationalError` se esgotar as tentativas.
+    """
+    config = config or configuracao()
+    engine = criar_engine(config, carga_local=carga_local)
+
+    for tentativa in range(1, config['tentativas'] + 1):
+        try:
+            with engine.connect():
+                return engine
+        except OperationalError as e:
+            if getattr(e.orig, 'errno', None) == ERRO_BANCO_INEXISTENTE:
+                print(f"Banco de dados '{config['nome']}' não existe. Criando...")
+                criar_banco(config)
+                continue
+            if tentativa == config['tentativas']:
+                engine.dispose()
+                raise
+            print(f"Servidor do banco ainda não está pronto... tentativa {tentativa} de {config['tentativas']}.")
+            time.sleep(config['espera_tentativa'])
+
+    # Última tentativa foi a criação do banco: confirma (ou levanta o erro)
+    with engine.connect():
+        return engine
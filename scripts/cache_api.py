@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import time
+
+## Cache incremental da API: um arquivo por página + manifesto append-only
+CACHE_DIR = 'api_cache'
+MANIFESTO = 'manifest.jsonl'
+
+
+def hash_pagina(conteudo):
+    """md5 do conteúdo da página serializado de forma canônica (detecta páginas alteradas)."""
+    return hashlib.md5(json.dumps(conteudo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class CacheAPI:
+    """
+    Cache em disco com checkpoint por página.
+
+    Cada página baixada é gravada em `pagina_NNNNN.json` assim que chega e
+    registrada em `manifest.jsonl`. Uma execução interrompida retoma a partir
+    das páginas que faltam; com `ttl` (segundos) apenas as páginas vencidas
+    são buscadas de novo. `ttl=None` confia no cache para sempre.
+    """
+
+    def __init__(self, diretorio=CACHE_DIR, ttl=None):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.paginas = {}
+        self.fim = None
+        # Páginas baixadas na última sincronização cujo conteúdo mudou (ou que não existiam)
+        self.alteradas = 0
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._ler_manifesto()
+
+    # --- Manifesto ---
+
+    @property
+    def caminho_manifesto(self):
+        return os.path.join(self.diretorio, MANIFESTO)
+
+    def _ler_manifesto(self):
+        if not os.path.exists(self.caminho_manifesto):
+            return
+        with open(self.caminho_manifesto, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    evento = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Última linha truncada por uma interrupção: ignora
+                    continue
+                if 'fim' in evento:
+                    self.fim = evento['fim']
+                else:
+                    self.paginas[evento['pagina']] = evento
+
+        # Descarta entradas cujo arquivo da página sumiu
+        for pagina in [p for p in self.paginas if not os.path.exists(self._arquivo(p))]:
+            del self.paginas[pagina]
+
+    def _registrar(self, evento):
+        with open(self.caminho_manifesto, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(evento) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compactar_manifesto(self):
+        """Reescreve o manifesto apenas com o estado atual (uma linha por página)."""
+        temporario = self.caminho_manifesto + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for pagina in sorted(self.paginas):
+                f.write(json.dumps(self.paginas[pagina]) + '\n')
+            if self.fim is not None:
+                f.write(json.dumps({'fim': self.fim}) + '\n')
+        os.replace(temporario, self.caminho_manifesto)
+
+    # --- Páginas ---
+
+    def _arquivo(self, pagina):
+        return os.path.join(self.diretorio, f'pagina_{pagina:05d}.json')
+
+    def pagina_valida(self, pagina, agora=None):
+        entrada = self.paginas.get(pagina)
+        if entrada is None:
+            return False
+        if self.ttl is None:
+            return True
+        return (agora or time.time()) - entrada['salvo_em'] < self.ttl
+
+    def paginas_validas(self):
+        agora = time.time()
+        return {p for p in self.paginas if self.pagina_valida(p, agora)}
+
+    def salvar_pagina(self, pagina, conteudo):
+        """
+        Grava a página de forma atômica e só então registra no manifesto, com o
+        hash do conteúdo. Retorna True se a página é nova ou mudou.
+        """
+        novo_hash = hash_pagina(conteudo)
+        alterada = self.paginas.get(pagina, {}).get('hash') != novo_hash
+        if alterada:
+            arquivo = self._arquivo(pagina)
+            temporario = arquivo + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(conteudo, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temporario, arquivo)
+
+        evento = {'pagina': pagina, 'registros': len(conteudo), 'hash': novo_hash, 'salvo_em': time.time()}
+        self._registrar(evento)
+        self.paginas[pagina] = evento
+        return alterada
+
+    def renovar_pagina(self, pagina):
+        """Dá a página como revalidada sem baixá-la de novo (mesmo conteúdo, novo `salvo_em`)."""
+        evento = dict(self.paginas[pagina], salvo_em=time.time())
+        self._registrar(evento)
+        self.paginas[pagina] = evento
+
+    def ler_pagina(self, pagina):
+        with open(self._arquivo(pagina), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def marcar_fim(self, pagina):
+        """Registra a página vazia que encerrou a extração e descarta páginas além dela."""
+        for antiga in [p for p in self.paginas if p >= pagina]:
+            del self.paginas[antiga]
+            os.remove(self._arquivo(antiga))
+        self.fim = pagina
+        self._registrar({'fim': pagina})
+
+    @property
+    def completo(self):
+        """True se a extração chegou ao fim e todas as páginas estão no cache e válidas."""
+        return self.fim is not None and self.paginas_validas() >= set(range(self.fim))
+
+    @property
+    def extracao_completa(self):
+        """
+        True se a extração chegou ao fim e todas as páginas estão no cache,
+        vencidas ou não: o cache tem todas as operações da UF, independente do ttl.
+        """
+        return self.fim is not None and set(self.paginas) >= set(range(self.fim))
+
+    def assinatura(self):
+        """
+        md5 do estado do cache (conteúdo de cada página e fim): muda sempre que
+        alguma página muda, mas não quando ela só foi baixada de novo igual.
+        Páginas gravadas antes do hash usam o horário de gravação.
+        """
+        estado = [(p, self.paginas[p].get('hash') or self.paginas[p]['salvo_em']) for p in sorted(self.paginas)]
+        return hashlib.md5(json.dumps([estado, self.fim]).encode('utf-8')).hexdigest()
+
+    def iter_paginas(self):
+        """Gera (pagina, hash, registros) de todas as páginas em ordem."""
+        for pagina in sorted(self.paginas):
+            registros = self.ler_pagina(pagina)
+            # Páginas gravadas antes do hash no manifesto: calcula na leitura
+            yield pagina, self.paginas[pagina].get('hash') or hash_pagina(registros), registros
+
+    def iter_registros(self):
+        """Percorre os registros de todas as páginas em ordem, uma página por vez."""
+        for _, _, registros in self.iter_paginas():
+            yield from registros
+
+    # --- Sincronização com a API ---
+
+    def sincronizar(self, extrator, parar_apos_iguais=0):
+        """
+        Busca apenas as páginas ausentes ou vencidas, gravando cada uma assim
+        que chega. Retorna o número de páginas baixadas nesta execução; as que
+        vieram com conteúdo diferente do cache ficam em `self.alteradas`.
+
+        Com `parar_apos_iguais=N`, depois de N páginas vencidas seguidas que
+        voltaram iguais a extração para e as demais páginas vencidas são dadas
+        como revalidadas. Só vale se a API devolve primeiro os projetos
+        alterados mais recentemente; por isso o padrão (0) revalida todas.
+        """
+        validas = self.paginas_validas()
+        self.alteradas = 0
+        if self.completo:
+            print(f"Cache {self.diretorio} completo e válido ({len(validas)} páginas). Nada a buscar.")
+            return 0
+
+        if validas:
+            print(f"Retomando extração em {self.diretorio}: {len(validas)} páginas já estão no cache.")
+
+        baixadas = iguais_seguidas = 0
+        for pagina, conteudo in extrator.iter_paginas(pular=validas):
+            revalidada = pagina in self.paginas
+            alterada = self.salvar_pagina(pagina, conteudo)
+            baixadas += 1
+            self.alteradas += alterada
+            print(f"{'Salvando página' if alterada else 'Página inalterada'} nº {pagina} em {self.diretorio} "
+                  f"({len(conteudo)} registros)")
+
+            iguais_seguidas = iguais_seguidas + 1 if revalidada and not alterada else 0
+            if parar_apos_iguais and iguais_seguidas >= parar_apos_iguais and self.fim is not None:
+                restantes = [p for p in self.paginas if p > pagina and p not in validas]
+                for restante in restantes:
+                    self.renovar_pagina(restante)
+                print(f"{iguais_seguidas} páginas seguidas sem alteração em {self.diretorio}: "
+                      f"parando e mantendo as {len(restantes)} páginas seguintes do cache.")
+                self.compactar_manifesto()
+                return baixadas
+
+        if extrator.ultima_pagina is not None:
+            self.marcar_fim(extrator.ultima_pagina)
+            self.compactar_manifesto()
+        else:
+            print(f"Extração de {self.diretorio} interrompida antes do fim. A próxima execução continuará de onde parou.")
+
+        return baixadas
@@ -0,0 +1,184 @@
+import csv
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import Integer
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+
+from esquema import metadata, metadata_com_sufixo
+
+## Carga em massa no MySQL (LOAD DATA LOCAL INFILE ou INSERT em lotes)
+
+METODOS = ('auto', 'load_data', 'executemany')
+
+
+class CarregadorBulk:
+    """
+    Grava DataFrames nas tabelas de `esquema.metadata` usando uma única conexão.
+
+    - `load_data`: escreve um CSV temporário e usa `LOAD DATA LOCAL INFILE`
+      (exige `local_infile=1` no servidor e `allow_local_infile` no cliente);
+    - `executemany`: INSERTs em lotes de `tamanho_lote` linhas;
+    - `auto`: tenta `load_data` e cai para `executemany` se o servidor recusar.
+
+    Dentro de `sessao()` as checagens de chave estrangeira e de unicidade ficam
+    desligadas e são religadas ao final. O tempo e as linhas de cada tabela são
+    acumulados para o relatório de linhas por segundo.
+
+    Com `sufixo` (ex.: '__novo') as linhas vão para as tabelas-sombra
+    `<tabela><sufixo>` criadas por `esquema.metadata_com_sufixo`.
+    """
+
+    def __init__(self, engine, metodo='auto', tamanho_lote=5000, sufixo=''):
+        if metodo not in METODOS:
+            raise ValueError(f"Método de carga inválido: {metodo}. Use um de {METODOS}.")
+        self.engine = engine
+        self.mysql = engine.dialect.name == 'mysql'
+        self.metodo = metodo if self.mysql else 'executemany'
+        self.tamanho_lote = tamanho_lote
+        self.sufixo = sufixo
+        self.destinos = metadata_com_sufixo(sufixo) if sufixo else metadata
+        self.conexao = None
+        self.estatisticas = {}
+
+    @contextmanager
+    def sessao(self):
+        """Abre a conexão de carga com as checagens desligadas e faz commit ao sair."""
+        with self.engine.connect() as conexao:
+            self.conexao = conexao
+            self._checagens(False)
+            try:
+                yield self
+                conexao.commit()
+            except Exception:
+                conexao.rollback()
+                raise
+            finally:
+                self._checagens(True)
+                self.conexao = None
+
+    def _checagens(self, ligadas):
+        valor = 1 if ligadas else 0
+        if self.mysql:
+            self.conexao.exec_driver_sql(f"SET FOREIGN_KEY_CHECKS = {valor}")
+            self.conexao.exec_driver_sql(f"SET UNIQUE_CHECKS = {valor}")
+        elif self.engine.dialect.name == 'sqlite':
+            self.conexao.exec_driver_sql(f"PRAGMA foreign_keys = {'ON' if ligadas else 'OFF'}")
+
+    def commit(self):
+        """Confirma o que já foi carregado (ex.: ao fim de cada lote carregado nas tabelas-sombra)."""
+        self.conexao.commit()
+
+    def _destino(self, nome_tabela):
+        return self.destinos.tables[f"{nome_tabela}{self.sufixo}"]
+
+    def carregar(self, nome_tabela, df, upsert=False):
+        """
+        Insere as linhas de `df` em `nome_tabela` pelo método configurado.
+        Com `upsert=True` as linhas cuja chave primária já existe são atualizadas
+        (`INSERT ... ON DUPLICATE KEY UPDATE`), sempre em lotes de INSERT.
+        """
+        if df.empty:
+            return
+        tabela = self._destino(nome_tabela)
+        df = _preparar(df[[c.name for c in tabela.columns if c.name in df.columns]], tabela)
+
+        inicio = time.perf_counter()
+        if upsert:
+            self._upsert(tabela, df)
+        elif self.metodo in ('auto', 'load_data'):
+            try:
+                self._load_data(tabela, df)
+            except DBAPIError as e:
+                if self.metodo == 'load_data':
+                    raise
+                print(f"LOAD DATA LOCAL INFILE indisponível ({e.orig}). Usando INSERT em lotes.")
+                self.metodo = 'executemany'
+                self._executemany(tabela, df)
+            else:
+                self.metodo = 'load_data'
+        else:
+            self._executemany(tabela, df)
+
+        linhas, segundos = self.estatisticas.get(nome_tabela, (0, 0.0))
+        self.estatisticas[nome_tabela] = (linhas + len(df), segundos + time.perf_counter() - inicio)
+
+    def _load_data(self, tabela, df):
+        colunas = ', '.join(df.columns)
+        descritor, caminho = tempfile.mkstemp(suffix='.tsv', prefix=f'{tabela.name}_')
+        try:
+            df = df.apply(lambda serie: serie.map(_escapar, na_action='ignore') if serie.dtype == object else serie)
+            with os.fdopen(descritor, 'w', encoding='utf-8', newline='') as f:
+                df.to_csv(f, sep='\t', header=False, index=False, na_rep='\\N', lineterminator='\n',
+                          quoting=csv.QUOTE_MINIMAL, quotechar='"', doublequote=True)
+            caminho_sql = caminho.replace('\\', '/')
+            self.conexao.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE '{caminho_sql}' INTO TABLE {tabela.name} "
+                "CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' ({colunas})"
+            )
+        finally:
+            os.remove(caminho)
+
+    def _executemany(self, tabela, df):
+        registros = df.astype(object).where(df.notna(), None).to_dict('records')
+        for inicio in range(0, len(registros), self.tamanho_lote):
+            self.conexao.execute(tabela.insert(), registros[inicio:inicio + self.tamanho_lote])
+
+    def _upsert(self, tabela, df):
+        if self.mysql:
+            comando = mysql_insert(tabela)
+            atualizacoes = {c.name: comando.inserted[c.name] for c in tabela.columns if not c.primary_key}
+            comando = comando.on_duplicate_key_update(atualizacoes) if atualizacoes else comando.prefix_with('IGNORE')
+        else:
+            comando = sqlite_insert(tabela)
+            atualizacoes = {c.name: comando.excluded[c.name] for c in tabela.columns if not c.primary_key}
+            chave = [c.name for c in tabela.primary_key.columns]
+            comando = (comando.on_conflict_do_update(index_elements=chave, set_=atualizacoes)
+                       if atualizacoes else comando.on_conflict_do_nothing(index_elements=chave))
+
+        registros = df.astype(object).where(df.notna(), None).to_dict('records')
+        for inicio in range(0, len(registros), self.tamanho_lote):
+            self.conexao.execute(comando, registros[inicio:inicio + self.tamanho_lote])
+
+    def excluir(self, nome_tabela, coluna, valores):
+        """Remove de `nome_tabela` as linhas com `coluna` em `valores` (em lotes)."""
+        tabela = self._destino(nome_tabela)
+        valores = list(valores)
+        for inicio in range(0, len(valores), self.tamanho_lote):
+            lote = valores[inicio:inicio + self.tamanho_lote]
+            self.conexao.execute(tabela.delete().where(tabela.c[coluna].in_(lote)))
+
+    def relatorio(self):
+        """DataFrame com linhas, segundos e linhas/s de cada tabela carregada."""
+        linhas = [
+            {'tabela': nome, 'linhas': qtd, 'segundos': round(seg, 3), 'linhas_por_segundo': round(qtd / seg) if seg else None}
+            for nome, (qtd, seg) in self.estatisticas.items()
+        ]
+        return pd.DataFrame(linhas, columns=['tabela', 'linhas', 'segundos', 'linhas_por_segundo'])
+
+    def imprimir_relatorio(self):
+        print(f"\nRelatório de carga (método: {self.metodo}):")
+        print(self.relatorio().to_string(index=False))
+
+
+def _preparar(df, tabela):
+    """Converte colunas inteiras que viraram float (por causa de nulos) em Int64."""
+    df = df.copy()
+    for coluna in tabela.columns:
+        if coluna.name in df.columns and isinstance(coluna.type, Integer) and df[coluna.name].dtype.kind == 'f':
+            df[coluna.name] = df[coluna.name].astype('Int64')
+    return df
+
+
+def _escapar(valor):
+    """Escapa barras, tabs e quebras de linha conforme o ESCAPED BY '\\' do LOAD DATA."""
+    if not isinstance(valor, str):
+        return valor
+    return valor.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
@@ -0,0 +1,201 @@
+from sqlalchemy import Table, Column, Index, Integer, SmallInteger, String, CHAR, MetaData, ForeignKey, DECIMAL, BIGINT, DateTime, inspect
+
+# Definição da estrutura (Schema) das tabelas
+metadata = MetaData()
+
+# Tabela de Dimensão: Eixos
+eixos_table = Table('eixos', metadata,
+    Column('id_eixo', Integer, primary_key=True),
+    Column('descricao_eixo', String(255))
+)
+
+# Tabela de Dimensão: Tipos
+tipos_table = Table('tipos', metadata,
+    Column('id_tipo', Integer, primary_key=True),
+    Column('descricao_tipo', String(255)),
+    Column('id_eixo', Integer, ForeignKey('eixos.id_eixo'))
+)
+
+# Tabela de Dimensão: Subtipos
+subtipos_table = Table('subtipos', metadata,
+    Column('id_subtipo', Integer, primary_key=True),
+    Column('descricao_subtipo', String(255)),
+    Column('id_tipo', Integer, ForeignKey('tipos.id_tipo'))
+)
+
+# Tabela de Dimensão: Órgãos (tomadores, executores e repassadores)
+orgaos_table = Table('orgaos', metadata,
+    Column('id_orgao', Integer, primary_key=True, autoincrement=False),
+    Column('codigo', BIGINT),
+    Column('nome', String(255))
+)
+
+# Tabela de Dimensão: Origens das fontes de recurso
+origens_recurso_table = Table('origens_recurso', metadata,
+    Column('id_origem', SmallInteger, primary_key=True, autoincrement=False),
+    Column('descricao_origem', String(255))
+)
+
+# Tabela de Fato: Operacoes
+# `valor_investimento_previsto` é a soma de todas as fontes de recurso; as colunas
+# de tomador/executor/repassador/origem guardam apenas o primeiro item da lista.
+# `sk_operacao` é a chave inteira usada por todas as tabelas de ligação.
+# `hash_conteudo` (md5 do registro da API) permite atualizar só as linhas alteradas.
+# `uf` é a unidade da federação da extração (uma partição do cache por UF).
+operacoes_table = Table('operacoes', metadata,
+    Column('id_operacao', String(100), primary_key=True),
+    Column('sk_operacao', Integer, nullable=False, unique=True),
+    Column('uf', CHAR(2)),
+    Column('hash_conteudo', CHAR(32)),
+    Column('valor_investimento_previsto', DECIMAL(15,2)),
+    Column('tomador_nome', String(255)),
+    Column('tomador_codigo', BIGINT),
+    Column('executor_nome', String(255)),
+    Column('executor_codigo', BIGINT),
+    Column('repassador_nome', String(255)),
+    Column('repassador_codigo', BIGINT),
+    Column('origem_fontes_de_recurso', String(255))
+)
+
+# Tabelas de Ligação Eixo
+operacao_eixo_rel_table = Table('operacao_eixo_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_eixo', Integer, ForeignKey('eixos.id_eixo'), primary_key=True),
+)
+
+# Tabelas de Ligação Tipo
+operacao_tipo_rel_table = Table('operacao_tipo_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_tipo', Integer, ForeignKey('tipos.id_tipo'), primary_key=True),
+)
+
+# Tabelas de Ligação Subtipo
+operacao_subtipo_rel_table = Table('operacao_subtipo_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_subtipo', Integer, ForeignKey('subtipos.id_subtipo'), primary_key=True)
+)
+
+# Tabelas de Ligação com Órgãos (todas as posições da lista, não só a primeira)
+operacao_tomador_rel_table = Table('operacao_tomador_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_orgao', Integer, ForeignKey('orgaos.id_orgao'), primary_key=True)
+)
+
+operacao_executor_rel_table = Table('operacao_executor_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_orgao', Integer, ForeignKey('orgaos.id_orgao'), primary_key=True)
+)
+
+operacao_repassador_rel_table = Table('operacao_repassador_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_orgao', Integer, ForeignKey('orgaos.id_orgao'), primary_key=True)
+)
+
+# Tabela de Ligação Fontes de Recurso (valor somado por origem dentro da operação)
+operacao_fonte_rel_table = Table('operacao_fonte_rel', metadata,
+    Column('sk_operacao', Integer, ForeignKey('operacoes.sk_operacao'), primary_key=True),
+    Column('id_origem', SmallInteger, ForeignKey('origens_recurso.id_origem'), primary_key=True),
+    Column('valor_investimento_previsto', DECIMAL(15,2))
+)
+
+# --- Índices secundários para os filtros do dashboard ---
+# As PKs das tabelas de ligação começam pela operação; estes índices atendem o
+# caminho inverso (dado um eixo/tipo/órgão/origem, quais operações).
+Index('ix_operacao_eixo_rel_eixo', operacao_eixo_rel_table.c.id_eixo, operacao_eixo_rel_table.c.sk_operacao)
+Index('ix_operacao_tipo_rel_tipo', operacao_tipo_rel_table.c.id_tipo, operacao_tipo_rel_table.c.sk_operacao)
+Index('ix_operacao_subtipo_rel_subtipo', operacao_subtipo_rel_table.c.id_subtipo, operacao_subtipo_rel_table.c.sk_operacao)
+Index('ix_operacao_tomador_rel_orgao', operacao_tomador_rel_table.c.id_orgao, operacao_tomador_rel_table.c.sk_operacao)
+Index('ix_operacao_executor_rel_orgao', operacao_executor_rel_table.c.id_orgao, operacao_executor_rel_table.c.sk_operacao)
+Index('ix_operacao_repassador_rel_orgao', operacao_repassador_rel_table.c.id_orgao, operacao_repassador_rel_table.c.sk_operacao)
+Index('ix_operacao_fonte_rel_origem', operacao_fonte_rel_table.c.id_origem, operacao_fonte_rel_table.c.sk_operacao)
+Index('ix_operacoes_valor', operacoes_table.c.valor_investimento_previsto)
+Index('ix_operacoes_uf', operacoes_table.c.uf)
+# Ordenação e busca por prefixo no explorador de dados do dashboard
+Index('ix_operacoes_tomador_nome', operacoes_table.c.tomador_nome)
+
+# --- Tabelas de Resumo (recalculadas ao fim de cada carga, ver `resumos.py`) ---
+
+# Métricas principais: sempre uma única linha
+resumo_kpis_table = Table('resumo_kpis', metadata,
+    Column('valor_total', DECIMAL(20,2)),
+    Column('num_operacoes', Integer),
+    Column('valor_medio', DECIMAL(20,2)),
+    Column('num_eixos', Integer),
+    Column('num_tipos', Integer),
+    Column('num_origens', Integer)
+)
+
+# Valor e contagem por eixo (rótulo com todos os eixos da operação)
+resumo_eixos_table = Table('resumo_eixos', metadata,
+    Column('eixo_descricao', String(1024)),
+    Column('valor_investimento_previsto', DECIMAL(20,2)),
+    Column('num_operacoes', Integer)
+)
+
+# Valor e contagem por tipo (rótulo com todos os tipos da operação)
+resumo_tipos_table = Table('resumo_tipos', metadata,
+    Column('tipo_descricao', String(1024)),
+    Column('valor_investimento_previsto', DECIMAL(20,2)),
+    Column('num_operacoes', Integer)
+)
+
+# Maiores tomadores por valor previsto
+resumo_top_tomadores_table = Table('resumo_top_tomadores', metadata,
+    Column('tomador_nome', String(255)),
+    Column('valor_investimento_previsto', DECIMAL(20,2)),
+    Column('num_operacoes', Integer)
+)
+
+# --- Controle das execuções do ETL ---
+# Fica fora de `metadata`: não é trocada pelo swap nem recriada com o esquema.
+metadata_controle = MetaData()
+
+# Uma linha por carga concluída; o maior `id_execucao` é a versão dos dados
+# publicada, usada pelo dashboard para invalidar o próprio cache.
+etl_runs_table = Table('etl_runs', metadata_controle,
+    Column('id_execucao', Integer, primary_key=True, autoincrement=True),
+    Column('modo', String(20)),
+    Column('num_operacoes', Integer),
+    Column('iniciada_em', DateTime),
+    Column('concluida_em', DateTime)
+)
+
+# Hash de cada página da API cujos projetos estão publicados nas tabelas. Na
+# carga incremental, uma página com o mesmo hash não precisa ser normalizada.
+paginas_api_table = Table('paginas_api', metadata_controle,
+    Column('uf', CHAR(2), primary_key=True),
+    Column('pagina', Integer, primary_key=True),
+    Column('hash_pagina', CHAR(32)),
+    Column('registros', Integer)
+)
+
+
+def esquema_desatualizado(engine):
+    """True se alguma tabela já existe no banco com colunas diferentes das definidas aqui."""
+    inspetor = inspect(engine)
+    for tabela in metadata.sorted_tables:
+        if not inspetor.has_table(tabela.name):
+            continue
+        colunas_banco = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        if colunas_banco != {coluna.name for coluna in tabela.columns}:
+            return True
+    return False
+
+
+def metadata_com_sufixo(sufixo):
+    """
+    Cópia do esquema com `sufixo` no nome de cada tabela (ex.: `operacoes__novo`),
+    com as chaves estrangeiras apontando para as tabelas de mesmo sufixo.
+    """
+    copia = MetaData()
+    for tabela in metadata.sorted_tables:
+        colunas = []
+        for coluna in tabela.columns:
+            chaves = [ForeignKey(f"{fk.column.table.name}{sufixo}.{fk.column.name}") for fk in coluna.foreign_keys]
+            colunas.append(Column(coluna.name, coluna.type, *chaves,
+                                  primary_key=coluna.primary_key, nullable=coluna.nullable,
+                                  unique=coluna.unique, autoincrement=coluna.autoincrement))
+        nova = Table(f"{tabela.name}{sufixo}", copia, *colunas)
+        for indice in tabela.indexes:
+            Index(indice.name, *[nova.c[c.name] for c in indice.columns], unique=indice.unique)
+    return copia
@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+## Motor de extração paginada da API ObrasGov
+API_URL = 'https://api.obrasgov.gestao.gov.br/obrasgov/api/projeto-investimento'
+
+# Todas as unidades da federação aceitas pelo filtro `uf` da API
+UFS = [
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO',
+]
+
+# Status que indicam limite de requisições / indisponibilidade temporária
+STATUS_LIMITE = (429, 503)
+
+
+class ErroPagina(Exception):
+    """Página respondeu com um status que não permite continuar a extração."""
+
+    def __init__(self, pagina, status_code):
+        super().__init__(f"Página {pagina} respondeu com status code {status_code}")
+        self.pagina = pagina
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    Limitador de taxa (token bucket) compartilhado entre as threads.
+    A taxa se adapta: cai pela metade a cada 429 e volta a subir
+    aos poucos a cada resposta bem-sucedida (AIMD).
+    """
+
+    def __init__(self, taxa=2.0, capacidade=2, taxa_minima=0.2, taxa_maxima=5.0,
+                 incremento=0.1, espera_maxima=60.0):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.incremento = incremento
+        self.espera_maxima = espera_maxima
+
+        self._tokens = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._pausa_ate = 0.0
+        self._falhas_seguidas = 0
+        self._lock = threading.Lock()
+
+    def _reabastecer(self, agora):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def adquirir(self):
+        """Bloqueia até haver um token disponível e nenhuma pausa ativa."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._reabastecer(agora)
+                if agora < self._pausa_ate:
+                    espera = self._pausa_ate - agora
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+    def penalizar(self, retry_after=None):
+        """Reduz a taxa e pausa todas as threads (honrando o Retry-After, se houver)."""
+        with self._lock:
+            self._falhas_seguidas += 1
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+            if retry_after is None:
+                retry_after = min(self.espera_maxima, 2 ** self._falhas_seguidas)
+            agora = time.monotonic()
+            self._pausa_ate = max(self._pausa_ate, agora + retry_after)
+            self._tokens = 0.0
+            self._ultimo = agora
+            return retry_after
+
+    def recompensar(self):
+        """Aumenta a taxa gradualmente após uma resposta bem-sucedida."""
+        with self._lock:
+            self._falhas_seguidas = 0
+            self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+
+
+def ler_retry_after(response):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos."""
+    valor = response.headers.get('Retry-After')
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+        return max(0.0, data.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def criar_sessao(tamanho_pool=8):
+    """Cria uma única sessão HTTP com pool de conexões reaproveitadas."""
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+class ExtratorPaginas:
+    """
+    Busca as páginas do endpoint `projeto-investimento` com um número limitado
+    de requisições em paralelo e entrega os resultados na ordem das páginas.
+    """
+
+    def __init__(self, uf='DF', filtros=None, url=API_URL, max_concorrencia=4,
+                 limitador=None, sessao=None, timeout=30, max_tentativas=5, max_limites=20):
+        """
+        `max_tentativas` limita os erros de conexão seguidos de uma página e
+        `max_limites` as respostas 429/503 seguidas: uma API que não para de
+        recusar encerra a extração (`ErroPagina`) em vez de esperar para sempre.
+        """
+        self.uf = uf
+        self.filtros = dict(filtros or {})
+        self.url = url
+        self.max_concorrencia = max_concorrencia
+        self.limitador = limitador or TokenBucket()
+        self.sessao = sessao or criar_sessao(max_concorrencia)
+        self.timeout = timeout
+        self.max_tentativas = max_tentativas
+        self.max_limites = max_limites
+        # Página vazia que marcou o fim da última extração (None se não chegou ao fim)
+        self.ultima_pagina = None
+
+    def _buscar_pagina(self, pagina):
+        params = dict(self.filtros)
+        if self.uf:
+            params['uf'] = self.uf
+        params['pagina'] = pagina
+
+        tentativas = limites = 0
+        while True:
+            self.limitador.adquirir()
+            try:
+                response = self.sessao.get(self.url, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                tentativas += 1
+                if tentativas >= self.max_tentativas:
+                    raise
+                espera = self.limitador.penalizar()
+                print(f"Erro de conexão na página {pagina} ({e}). Nova tentativa em {espera:.0f}s...")
+                continue
+
+            if response.status_code == 200:
+                self.limitador.recompensar()
+                data = response.json()
+                return (data or {}).get('content') or []
+
+            if response.status_code in STATUS_LIMITE:
+                limites += 1
+                if limites >= self.max_limites:
+                    raise ErroPagina(pagina, response.status_code)
+                espera = self.limitador.penalizar(ler_retry_after(response))
+                print(f"Erro {response.status_code} na página {pagina}. Reduzindo a taxa para "
+                      f"{self.limitador.taxa:.2f} req/s e aguardando {espera:.0f}s...")
+                continue
+
+            raise ErroPagina(pagina, response.status_code)
+
+    def iter_paginas(self, pagina_inicial=0, pular=()):
+        """
+        Gera tuplas (pagina, conteudo) em ordem, mantendo no máximo
+        `max_concorrencia` requisições em andamento. Páginas em `pular`
+        (ex.: já presentes no cache) não são requisitadas nem entregues.
+        Para na primeira página vazia ou com erro.
+        """
+        pular = set(pular)
+        self.ultima_pagina = None
+        pool = ThreadPoolExecutor(max_workers=self.max_concorrencia)
+        pendentes = deque()
+        proxima_envio = pagina_inicial
+        try:
+            while True:
+                while len(pendentes) < self.max_concorrencia:
+                    while proxima_envio in pular:
+                        proxima_envio += 1
+                    pendentes.append((proxima_envio, pool.submit(self._buscar_pagina, proxima_envio)))
+                    proxima_envio += 1
+
+                pagina, futuro = pendentes.popleft()
+                try:
+                    conteudo = futuro.result()
+                except ErroPagina as e:
+                    print(f"Erro na página nº: {e.pagina} com status code: {e.status_code}. Parando extração.")
+                    return
+                except requests.exceptions.RequestException as e:
+                    print(f"Erro de conexão persistente na página nº: {pagina} ({e}). Parando extração.")
+                    return
+
+                if not conteudo:
+                    print("Parando: Nenhum conteúdo na página. Extração concluída.")
+                    self.ultima_pagina = pagina
+                    return
+
+                yield pagina, conteudo
+        finally:
+            for _, futuro in pendentes:
+                futuro.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,276 @@
+import hashlib
+import json
+from array import array
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+## Normalização dos registros da API nas tabelas de fato, dimensão e ligação
+
+# Colunas da tabela de fato `operacoes` (apenas os atributos usados no dashboard)
+colunas_para_operacoes = [
+    'id_operacao',
+    'sk_operacao',
+    'uf',
+    'hash_conteudo',
+    'valor_investimento_previsto',
+    'tomador_nome',
+    'tomador_codigo',
+    'executor_nome',
+    'executor_codigo',
+    'repassador_nome',
+    'repassador_codigo',
+    'origem_fontes_de_recurso'
+]
+
+# Ordem de carga que respeita as chaves estrangeiras
+ORDEM_TABELAS = [
+    'eixos',
+    'tipos',
+    'subtipos',
+    'orgaos',
+    'origens_recurso',
+    'operacoes',
+    'operacao_eixo_rel',
+    'operacao_tipo_rel',
+    'operacao_subtipo_rel',
+    'operacao_tomador_rel',
+    'operacao_executor_rel',
+    'operacao_repassador_rel',
+    'operacao_fonte_rel',
+]
+
+
+def iter_lotes(registros, tamanho_lote):
+    """Agrupa um iterável de registros em listas de até `tamanho_lote` itens."""
+    registros = iter(registros)
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            return
+        yield lote
+
+
+class RegistroDimensao:
+    """
+    Dimensão deduplicada em fluxo, à medida que os registros chegam.
+
+    Cada chave natural recebe um id inteiro compacto na primeira vez que
+    aparece (ou usa o próprio id da API, com `id_da_api`) e só então a linha
+    da dimensão é montada, por `atributos(item)`. As repetições custam uma
+    consulta a dicionário, então a memória e o tempo crescem com o número de
+    valores distintos, não com o número de ligações.
+    """
+
+    def __init__(self, colunas, atributos, ids=None, id_da_api=False):
+        """
+        `colunas` = [coluna do id, *colunas de `atributos`]. `ids` (chave
+        natural -> id) vem do banco na carga incremental e mantém os ids
+        estáveis entre execuções.
+        """
+        self.colunas = colunas
+        self.atributos = atributos
+        self.id_da_api = id_da_api
+        self.ids = dict(ids or {})
+        self.proximo = max(self.ids.values(), default=0) + 1
+        # Ids cuja linha já foi emitida nesta execução
+        self.emitidos = set()
+        self.novas = {coluna: [] for coluna in colunas}
+
+    def id_de(self, chave, item):
+        """Id inteiro de `chave`, emitindo a linha da dimensão na primeira ocorrência."""
+        if self.id_da_api:
+            id_ = chave
+        else:
+            id_ = self.ids.get(chave)
+            if id_ is None:
+                id_ = self.ids[chave] = self.proximo
+                self.proximo += 1
+        if id_ not in self.emitidos:
+            self.emitidos.add(id_)
+            self.novas[self.colunas[0]].append(id_)
+            for coluna, valor in zip(self.colunas[1:], self.atributos(item)):
+                self.novas[coluna].append(valor)
+        return id_
+
+    def linhas(self):
+        """DataFrame com as linhas emitidas desde a última chamada."""
+        df = pd.DataFrame(self.novas, columns=self.colunas)
+        self.novas = {coluna: [] for coluna in self.colunas}
+        return df
+
+
+class Ligacoes:
+    """
+    Linhas de uma tabela de ligação como arrays de inteiros (`array('q')`):
+    8 bytes por valor em vez de um objeto Python por célula. O DataFrame final
+    usa esses buffers diretamente (`copy=False`); a conversão para os dtypes
+    compactos do staging (`staging.compactar`) é que gera a cópia.
+    """
+
+    def __init__(self, coluna_dimensao):
+        self.coluna_dimensao = coluna_dimensao
+        self.sk_operacao = array('q')
+        self.ids = array('q')
+
+    def adicionar(self, sk_operacao, ids):
+        self.sk_operacao.extend([sk_operacao] * len(ids))
+        self.ids.extend(ids)
+
+    def tabela(self):
+        return pd.DataFrame({
+            'sk_operacao': np.frombuffer(self.sk_operacao, dtype=np.int64),
+            self.coluna_dimensao: np.frombuffer(self.ids, dtype=np.int64),
+        }, copy=False)
+
+
+class Normalizador:
+    """
+    Converte lotes de registros da API nas tabelas do banco (ver `ORDEM_TABELAS`).
+
+    Guarda apenas as dimensões (`RegistroDimensao`) e os ids de operação já
+    emitidos entre um lote e outro, então pode ser usado em streaming: cada
+    chamada a `normaliza` devolve somente as linhas novas daquele lote. Também
+    atribui as chaves inteiras `sk_operacao`, `id_orgao` e `id_origem`; todas
+    as tabelas de ligação usam só inteiros (`sk_operacao` + id da dimensão).
+    """
+
+    def __init__(self, chaves_operacao=None, orgaos=None, origens=None, calcular_hash=True):
+        """
+        Os dicionários opcionais vêm do banco (carga incremental) e mantêm as
+        chaves inteiras estáveis entre execuções:
+        `chaves_operacao` id_operacao -> sk_operacao, `orgaos` (codigo, nome) ->
+        id_orgao e `origens` descricao -> id_origem. Como as demais dimensões,
+        cada órgão/origem é emitido uma vez por execução (mesmo os já
+        conhecidos), então a saída da execução é autossuficiente.
+
+        `hash_conteudo` (ver `hash_registro`) é a parte mais cara da
+        normalização e só serve para o upsert comparar registros; com
+        `calcular_hash=False` a coluna fica nula (tratada como alterada).
+        """
+        self.eixos = RegistroDimensao(['id_eixo', 'descricao_eixo'],
+                                      lambda eixo: (eixo.get('descricao'),), id_da_api=True)
+        self.tipos = RegistroDimensao(['id_tipo', 'descricao_tipo', 'id_eixo'],
+                                      lambda tipo: (tipo.get('descricao'), tipo.get('idEixo')), id_da_api=True)
+        self.subtipos = RegistroDimensao(['id_subtipo', 'descricao_subtipo', 'id_tipo'],
+                                         lambda subtipo: (subtipo.get('descricao'), subtipo.get('idTipo')),
+                                         id_da_api=True)
+        self.orgaos = RegistroDimensao(['id_orgao', 'codigo', 'nome'],
+                                       lambda orgao: (orgao.get('codigo'), orgao.get('nome')), ids=orgaos)
+        self.origens = RegistroDimensao(['id_origem', 'descricao_origem'],
+                                        lambda fonte: (fonte.get('origem'),), ids=origens)
+        self.calcular_hash = calcular_hash
+        self.operacoes_vistas = set()
+        self.chaves_operacao = dict(chaves_operacao or {})
+        self.proxima_sk = max(self.chaves_operacao.values(), default=0) + 1
+
+    def normaliza(self, registros):
+        """
+        Retorna um dicionário {nome_tabela: DataFrame} com as linhas do lote.
+
+        Percorre os registros uma única vez montando listas por coluna, em vez
+        de um `apply` por atributo e um `iterrows` para as listas aninhadas; os
+        DataFrames só são criados no final, a partir dessas listas.
+        """
+        operacoes = {coluna: [] for coluna in colunas_para_operacoes}
+        ligacoes = {
+            'eixos': Ligacoes('id_eixo'),
+            'tipos': Ligacoes('id_tipo'),
+            'subTipos': Ligacoes('id_subtipo'),
+            'tomadores': Ligacoes('id_orgao'),
+            'executores': Ligacoes('id_orgao'),
+            'repassadores': Ligacoes('id_orgao'),
+        }
+        dimensoes = {'eixos': self.eixos, 'tipos': self.tipos, 'subTipos': self.subtipos}
+        operacaoFonteRel = {'sk_operacao': array('q'), 'id_origem': array('q'), 'valor_investimento_previsto': []}
+
+        for registro in registros:
+            id_op = registro['idUnico']
+
+            # Mantém a primeira ocorrência de cada operação, inclusive entre lotes
+            if id_op in self.operacoes_vistas:
+                continue
+            self.operacoes_vistas.add(id_op)
+            sk_op = self.chaves_operacao.get(id_op)
+            if sk_op is None:
+                sk_op = self.chaves_operacao[id_op] = self.proxima_sk
+                self.proxima_sk += 1
+
+            tomador = _primeiro(registro.get('tomadores'))
+            executor = _primeiro(registro.get('executores'))
+            repassador = _primeiro(registro.get('repassadores'))
+            fonte = _primeiro(registro.get('fontesDeRecurso'))
+
+            # --- Eixos, tipos e subtipos: id da própria API ---
+            for campo, dimensao in dimensoes.items():
+                # dict como conjunto ordenado: cada id uma vez, na ordem da API
+                ids = {dimensao.id_de(item['id'], item): None for item in registro.get(campo) or ()}
+                ligacoes[campo].adicionar(sk_op, list(ids))
+
+            # --- Órgãos: todas as posições de cada lista ---
+            for papel in ('tomadores', 'executores', 'repassadores'):
+                ids = {self.orgaos.id_de((orgao.get('codigo'), orgao.get('nome')), orgao): None
+                       for orgao in registro.get(papel) or ()}
+                ligacoes[papel].adicionar(sk_op, list(ids))
+
+            # --- Fontes de recurso: valor somado por origem ---
+            valores_por_origem = {}
+            for fonte_recurso in registro.get('fontesDeRecurso') or ():
+                id_origem = self.origens.id_de(fonte_recurso.get('origem'), fonte_recurso)
+                valor = fonte_recurso.get('valorInvestimentoPrevisto')
+                if valor is not None:
+                    valores_por_origem[id_origem] = valores_por_origem.get(id_origem, 0) + valor
+                else:
+                    valores_por_origem.setdefault(id_origem, None)
+
+            for id_origem, valor in valores_por_origem.items():
+                operacaoFonteRel['sk_operacao'].append(sk_op)
+                operacaoFonteRel['id_origem'].append(id_origem)
+                operacaoFonteRel['valor_investimento_previsto'].append(round(valor, 2) if valor is not None else None)
+
+            valores = [v for v in valores_por_origem.values() if v is not None]
+
+            operacoes['id_operacao'].append(id_op)
+            operacoes['sk_operacao'].append(sk_op)
+            operacoes['uf'].append(registro.get('uf'))
+            operacoes['hash_conteudo'].append(hash_registro(registro) if self.calcular_hash else None)
+            operacoes['valor_investimento_previsto'].append(round(sum(valores), 2) if valores else None)
+            operacoes['tomador_nome'].append(tomador.get('nome'))
+            operacoes['tomador_codigo'].append(tomador.get('codigo'))
+            operacoes['executor_nome'].append(executor.get('nome'))
+            operacoes['executor_codigo'].append(executor.get('codigo'))
+            operacoes['repassador_nome'].append(repassador.get('nome'))
+            operacoes['repassador_codigo'].append(repassador.get('codigo'))
+            operacoes['origem_fontes_de_recurso'].append(fonte.get('origem'))
+
+        return {
+            'eixos': self.eixos.linhas(),
+            'tipos': self.tipos.linhas(),
+            'subtipos': self.subtipos.linhas(),
+            'orgaos': self.orgaos.linhas(),
+            'origens_recurso': self.origens.linhas(),
+            'operacoes': pd.DataFrame(operacoes),
+            'operacao_eixo_rel': ligacoes['eixos'].tabela(),
+            'operacao_tipo_rel': ligacoes['tipos'].tabela(),
+            'operacao_subtipo_rel': ligacoes['subTipos'].tabela(),
+            'operacao_tomador_rel': ligacoes['tomadores'].tabela(),
+            'operacao_executor_rel': ligacoes['executores'].tabela(),
+            'operacao_repassador_rel': ligacoes['repassadores'].tabela(),
+            'operacao_fonte_rel': pd.DataFrame({
+                'sk_operacao': np.frombuffer(operacaoFonteRel['sk_operacao'], dtype=np.int64),
+                'id_origem': np.frombuffer(operacaoFonteRel['id_origem'], dtype=np.int64),
+                'valor_investimento_previsto': operacaoFonteRel['valor_investimento_previsto'],
+            }, copy=False),
+        }
+
+
+def hash_registro(registro):
+    """md5 do registro da API serializado de forma canônica (detecta alterações)."""
+    return hashlib.md5(json.dumps(registro, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _primeiro(itens):
+    """Primeiro elemento de uma lista aninhada da API (ou {} se vazia)."""
+    return itens[0] if itens else {}
+
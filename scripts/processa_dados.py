@@ -1,317 +1,462 @@
-import pandas as pd
-from sqlalchemy import create_engine, text, Table, Column, Integer, String, MetaData, ForeignKey, DECIMAL, BIGINT
-import requests
-import json
-import pandas as pd
-import time
+import argparse
 import os
+import sys
+from datetime import datetime
 from sqlalchemy.exc import OperationalError
-
-## Trazendo as informações da api com o método get
-CACHE_FILE = 'api_cache.json'
-
-def fetch_data(filters={}):
-    resultado = []
-    count = 0
-    while(True):
-        url = (f'https://api.obrasgov.gestao.gov.br/obrasgov/api/projeto-investimento?uf=DF&pagina={count}')
-        
-        try:
-            response = requests.get(url, params=filters)
-
-            if response.status_code == 200:
-                data = response.json()
-                if data and data['content']:
-                    print(f"Adicionando dados da página nº: {count}")
-                    resultado.extend(data['content'])
-                else:
-                    print("Parando: Nenhum conteúdo na página. Extração concluída.")
-                    break
-            
-            elif response.status_code == 429:
-                print(f"Erro 429 (Too Many Requests) na página {count}. Aguardando 60 segundos para tentar novamente...")
-                time.sleep(60)
-                continue
-            
-            else:
-                print(f"Erro na página nº: {count} com status code: {response.status_code}. Parando extração.")
-                break
-
-            count += 1
-            time.sleep(1)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Erro de conexão (ex: timeout): {e}. Aguardando 30 segundos...")
-            time.sleep(30)
-            continue 
-
-    return resultado
-
-
-
-def get_data_from_api_or_cache(cache_file=CACHE_FILE):
+from extracao import API_URL
+from agendador import AgendadorUFs, ler_ufs
+from banco import configuracao, conectar, url_banco
+from normalizacao import Normalizador, iter_lotes, ORDEM_TABELAS
+from esquema import metadata, metadata_controle, esquema_desatualizado, paginas_api_table
+from carga import CarregadorBulk
+from resumos import atualizar_resumos
+from staging import STAGING_DIR, GravadorStaging, Staging
+from relatorio import RELATORIOS_DIR, RelatorioExecucao
+from publicacao import (MODOS_PUBLICACAO, SUFIXO_NOVO, PublicadorUpsert, concluir_execucao, iniciar_execucao,
+                        ler_estado_atual, preparar_tabelas_sombra, publicacao_interrompida,
+                        publicar_tabelas_sombra, registrar_execucao, registrar_paginas, suporta_swap,
+                        ufs_publicadas, versao_atual)
+
+## ETL em três etapas (extração, normalização e carga), importável e executável por linha de comando:
+##   python scripts/processa_dados.py [--stage extracao|normalizacao|carga|todas] [--from-cache] [--uf DF,GO] [--dry-run]
+ETAPAS = ('extracao', 'normalizacao', 'carga')
+
+# Endpoint `projeto-investimento` da API (ex.: um servidor de teste)
+API_URL = os.environ.get('API_URL', API_URL)
+
+CACHE_DIR = os.environ.get('API_CACHE_DIR', 'api_cache')
+
+# Validade das páginas do cache em segundos (vazio = cache vale para sempre)
+CACHE_TTL = float(os.environ['API_CACHE_TTL']) if os.environ.get('API_CACHE_TTL') else None
+
+# UFs extraídas: lista separada por vírgula ('DF,GO') ou 'todas'. Cada UF tem
+# sua partição no cache (`api_cache/uf=XX`) e elas são buscadas em paralelo
+# dividindo o mesmo limite de requisições.
+UFS_EXTRACAO = ler_ufs(os.environ.get('ETL_UFS', 'DF'))
+UFS_PARALELAS = int(os.environ.get('ETL_UFS_PARALELAS', 4))
+CONCORRENCIA_POR_UF = int(os.environ.get('ETL_CONCORRENCIA_POR_UF', 2))
+
+# Ao revalidar o cache, para depois de N páginas seguidas iguais às do cache
+# (0 = revalida todas). Ver `cache_api.CacheAPI.sincronizar`.
+PARAR_APOS_PAGINAS_IGUAIS = int(os.environ.get('ETL_PARAR_APOS_PAGINAS_IGUAIS', 0))
+
+# Quantidade de projetos normalizados e gravados por vez
+TAMANHO_LOTE = int(os.environ.get('ETL_TAMANHO_LOTE', 5000))
+
+# Carga em massa: 'auto' (LOAD DATA com fallback), 'load_data' ou 'executemany'
+METODO_CARGA = os.environ.get('ETL_METODO_CARGA', 'auto')
+TAMANHO_LOTE_INSERT = int(os.environ.get('ETL_TAMANHO_LOTE_INSERT', 5000))
+
+# Publicação: 'swap' (tabelas-sombra + RENAME atômico) ou 'upsert' (só linhas alteradas)
+MODO_PUBLICACAO = os.environ.get('ETL_MODO_PUBLICACAO', 'swap')
+if MODO_PUBLICACAO not in MODOS_PUBLICACAO:
+    raise ValueError(f"ETL_MODO_PUBLICACAO inválido: {MODO_PUBLICACAO}. Use um de {MODOS_PUBLICACAO}.")
+
+# Staging em Parquet dos dados normalizados: é a saída da normalização e a
+# entrada da carga. Se o cache da API não mudou desde a última execução, a
+# normalização é pulada e a carga lê o staging existente.
+STAGING_DIR = os.environ.get('ETL_STAGING_DIR', STAGING_DIR)
+REUSAR_STAGING = os.environ.get('ETL_REUSAR_STAGING', '1') == '1'
+
+# Relatório de cada execução (tempo, linhas e pico de memória por etapa)
+RELATORIOS_DIR = os.environ.get('ETL_RELATORIOS_DIR', RELATORIOS_DIR)
+
+
+def modo_publicacao(modo=MODO_PUBLICACAO, config=None):
     """
-    Verifica se o cache (arquivo JSON) existe.
-    Se existir, lê os dados do arquivo.
-    Se não existir, chama a API (fetch_data) e salva os resultados no arquivo.
+    Modo efetivo para o banco configurado: o swap só existe no MySQL (ver
+    `publicacao.suporta_swap`); nos demais bancos a carga usa o upsert.
     """
-    if os.path.exists(cache_file):
-        print(f"Lendo dados do cache local: {cache_file}")
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-            return dados
-        except json.JSONDecodeError:
-            print("Erro ao ler o arquivo JSON. O arquivo pode estar corrompido.")
-            pass
-
-    print("Cache não encontrado. Buscando dados da API... (Isso pode demorar)")
-    dados = fetch_data()
-    
-    if dados:
-        print(f"Salvando dados da API no cache: {cache_file}")
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(dados, f, ensure_ascii=False, indent=4)
-    else:
-        print("Nenhum dado foi retornado da API. O cache não foi criado.")
-    
-    return dados
-
-dados = get_data_from_api_or_cache()
-
-df = pd.DataFrame(dados)
-
-df[['idUnico','nome','subTipos', 'tipos']]
-
-df['tomadorNome'] = df['tomadores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
-df['tomadorCodigo'] = df['tomadores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
-
-df['executorNome'] = df['executores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
-df['executorCodigo'] = df['executores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
-
-df['repassadorNome'] = df['repassadores'].apply(lambda x: x[0]['nome'] if len(x) > 0 else None)
-df['repassadorCodigo'] = df['repassadores'].apply(lambda x: x[0]['codigo'] if len(x) > 0 else None)
-
-df['origemFontesDeRecurso'] = df['fontesDeRecurso'].apply(lambda x: x[0]['origem'] if len(x) > 0 else None)
-df['valorInvestimentoPrevisto'] = df['fontesDeRecurso'].apply(lambda x: x[0]['valorInvestimentoPrevisto'] if len(x) > 0 else None)
-
-df_principal = df.drop(columns=['tomadores','executores','repassadores','fontesDeRecurso'])
-
-# Listas para armazenar os dados extraídos
-eixosData = []
-tiposData = []
-subtiposData = []
-
-# Listas para as tabelas de ligação
-operacaoEixoRel = []
-operacaoTipoRel = []
-operacaoSubtipoRel = []
-
-# Iterar sobre o DataFrame original para extrair os dados aninhados
-for index, row in df_principal.iterrows():
-    id_op = row['idUnico']
-
-    for eixo in row['eixos']:
-        eixosData.append(eixo)
-        operacaoEixoRel.append({'idUnico': id_op, 'id_eixo': eixo['id']})
+    dialeto = url_banco(config or configuracao()).get_backend_name()
+    if modo == 'swap' and not suporta_swap(dialeto):
+        print(f"O modo swap precisa do MySQL (banco configurado: {dialeto}). Usando o modo upsert.")
+        return 'upsert'
+    return modo
 
-    for tipo in row['tipos']:
-        tiposData.append(tipo)
-        operacaoTipoRel.append({'idUnico': id_op, 'id_tipo': tipo['id']})
 
-    for subtipo in row['subTipos']:
-        subtiposData.append(subtipo)
-        operacaoSubtipoRel.append({'idUnico': id_op, 'id_subtipo': subtipo['id']})
+def motivo_sem_swap(engine, fontes):
+    """
+    Por que o swap não pode publicar esta execução, ou None se pode. O swap
+    troca as tabelas publicadas inteiras pelo staging: uma UF cuja extração
+    parou no meio perderia as operações das páginas que faltaram, e uma UF
+    publicada que não foi pedida (ex.: `--uf GO`) perderia todas.
+    """
+    incompletas = sorted(set(fontes.ufs) - fontes.ufs_completas())
+    if incompletas:
+        return f"extração incompleta de {', '.join(incompletas)}"
+    fora = sorted(ufs_publicadas(engine) - set(fontes.ufs))
+    if fora:
+        return f"UFs publicadas fora desta execução: {', '.join(fora)}"
+    return None
 
-# --- Criar os novos DataFrames (Tabelas de Dimensão) ---
 
-# DataFrame de Eixos
-df_eixos = pd.DataFrame(eixosData).drop_duplicates(subset=['id']).reset_index(drop=True)
+def get_data_from_api_or_cache(ufs=UFS_EXTRACAO, cache_dir=CACHE_DIR, ttl=CACHE_TTL, somente_cache=False):
+    """
+    Usa o cache incremental por página (ver `cache_api.CacheAPI`), com uma
+    partição por UF sincronizada pelo `agendador.AgendadorUFs`.
+    Páginas ausentes ou vencidas (ttl em segundos) são buscadas na API e
+    gravadas uma a uma, então uma execução interrompida retoma de onde parou.
+    Com `somente_cache=True` a API não é consultada.
+
+    Retorna o agendador: `iter_registros()` lê os registros do cache uma
+    página por vez.
+    """
+    agendador = AgendadorUFs(ufs, cache_dir, ttl=ttl,
+                             max_ufs_paralelas=UFS_PARALELAS, max_concorrencia_por_uf=CONCORRENCIA_POR_UF,
+                             parar_apos_iguais=PARAR_APOS_PAGINAS_IGUAIS, url=API_URL)
+    if not somente_cache:
+        progresso = agendador.executar()
 
-# DataFrame Tabela de ligação de Eixos
-df_operacaoEixoRel = pd.DataFrame(operacaoEixoRel).drop_duplicates().reset_index(drop=True)
+        com_erro = [uf for uf, estado in progresso.items() if estado['status'] == 'erro']
+        if com_erro:
+            print(f"UFs com erro na extração (usando o que já estiver no cache): {', '.join(com_erro)}")
 
-# DataFrame de Tipos
-df_tipos = pd.DataFrame(tiposData).drop_duplicates(subset=['id']).reset_index(drop=True)
+    print(f"Lendo dados do cache local: {cache_dir}")
+    return agendador
 
-# DataFrame Tabewla de ligação de Tipos
-df_operacaoTipoRel = pd.DataFrame(operacaoTipoRel).drop_duplicates().reset_index(drop=True)
 
-# DataFrame de SubTipos
-df_subtipos = pd.DataFrame(subtiposData).drop_duplicates(subset=['id']).reset_index(drop=True)
+def registros_no_cache(fontes):
+    """Total de registros nas páginas em cache de todas as UFs."""
+    return sum(pagina.get('registros', 0) for uf in fontes.ufs for pagina in fontes.cache(uf).paginas.values())
 
-# DataFrame Tabela de ligação de Subtipos
-df_operacaoSubtipoRel = pd.DataFrame(operacaoSubtipoRel).drop_duplicates().reset_index(drop=True)
 
-# DataFrame Principal dos Dados
-df_principal_final = df_principal.drop(columns=['tipos','subTipos','eixos'])
+def conectar_banco():
+    """Engine do ETL; encerra o processo se o servidor não responder."""
+    print("Iniciando verificação do banco de dados...")
+    # Conexão configurada por variáveis de ambiente (DB_HOST, DB_USUARIO, DB_POOL_*...), ver `banco.py`
+    configuracao_banco = configuracao()
+    try:
+        # carga_local habilita o LOAD DATA LOCAL INFILE usado pela carga em massa
+        engine = conectar(configuracao_banco, carga_local=True)
+    except OperationalError as e:
+        print(f"Não foi possível conectar ao banco de dados após várias tentativas: {e}")
+        sys.exit(1)
+    print(f"Conexão com o banco de dados '{configuracao_banco['nome']}' estabelecida!")
+    return engine
 
-df_principal_final = df_principal_final.drop_duplicates(subset=['idUnico'], keep='first')
 
-# Renomeia as colunas
-df_eixos.rename(columns={'id': 'id_eixo', 'descricao': 'descricao_eixo'}, inplace=True)
-df_tipos.rename(columns={'id': 'id_tipo', 'descricao': 'descricao_tipo', 'idEixo': 'id_eixo'}, inplace=True)
-df_subtipos.rename(columns={'id': 'id_subtipo', 'descricao': 'descricao_subtipo', 'idTipo': 'id_tipo'}, inplace=True)
+def preparar_upsert(engine):
+    """
+    Garante o esquema atual e lê o estado do banco (chaves e hashes), usado
+    tanto para semear as chaves da normalização quanto pela carga.
 
-df_operacaoEixoRel.rename(columns={'idUnico':'id_operacao','id_eixo': 'id_eixo'}, inplace=True)
-df_operacaoTipoRel.rename(columns={'idUnico':'id_operacao', 'id_tipo': 'id_tipo'}, inplace=True)
-df_operacaoSubtipoRel.rename(columns={'idUnico':'id_operacao', 'id_subtipo': 'id_subtipo'}, inplace=True)
-df_principal_final.rename(columns={
-    'idUnico': 'id_operacao',
-    'valorInvestimentoPrevisto': 'valor_investimento_previsto',
-    'tomadorNome': 'tomador_nome',
-    'tomadorCodigo': 'tomador_codigo',
-    'executorNome': 'executor_nome',
-    'executorCodigo': 'executor_codigo',
-    'repassadorNome': 'repassador_nome',
-    'repassadorCodigo': 'repassador_codigo',
-    'origemFontesDeRecurso': 'origem_fontes_de_recurso'
-}, inplace=True)
+    Devolve None se as tabelas publicadas têm um esquema antigo: nada é
+    apagado aqui (o dashboard continua lendo os dados atuais durante a
+    extração e a normalização); a carga publica tudo de novo, ver `carregar`.
+    """
+    print("Criando/Verificando tabelas no banco de dados...")
+    metadata_controle.create_all(engine)
+    if esquema_desatualizado(engine):
+        print("Esquema antigo detectado: os dados serão normalizados e publicados por completo.")
+        return None
+    metadata.create_all(engine)
+    return ler_estado_atual(engine)
 
 
-colunas_para_operacoes = [
-    'id_operacao', 
-    'valor_investimento_previsto',
-    'tomador_nome', 
-    'tomador_codigo',
-    'executor_nome',
-    'executor_codigo',
-    'repassador_nome',
-    'repassador_codigo',
-    'origem_fontes_de_recurso'
-]
+def recriar_tabelas(engine):
+    """
+    Troca o esquema antigo pelo atual sem tabelas-sombra (bancos sem swap):
+    apaga as tabelas publicadas e os hashes das páginas, que não valem mais.
+    Só é chamada pela carga, com o staging completo já pronto.
+    """
+    print("Esquema antigo e banco sem swap: recriando as tabelas antes da carga...")
+    metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.execute(paginas_api_table.delete())
+    metadata.create_all(engine)
 
-#Adicionando apenas os atributos a serem utilizados no dashboard
-df_principal_final_filtrado = df_principal_final[colunas_para_operacoes]
 
+def extrair(ufs=UFS_EXTRACAO, somente_cache=False):
+    """Etapa de extração: sincroniza o cache da API de cada UF e devolve as fontes."""
+    return get_data_from_api_or_cache(ufs, somente_cache=somente_cache)
 
-print("Iniciando verificação do banco de dados...")
 
-db_user = "root"
-db_password = "root" # Senha do docker-compose
-db_host = "db"
-db_name = "dados_governo"
-db_port = 3306
+def registros_alterados(fontes, estado, paginas, ids_inalterados):
+    """
+    Registros a normalizar, página a página. Na carga incremental (com
+    `estado`), uma página com o mesmo hash da última publicada e cujas
+    operações continuam no banco é pulada: só os ids dela vão para
+    `ids_inalterados`. Cada página lida é anotada em `paginas`.
+    """
+    for uf, pagina, hash_, registros in fontes.iter_paginas():
+        paginas.append([uf, pagina, hash_, len(registros)])
+        if (estado is not None and estado['paginas'].get((uf, pagina)) == hash_
+                and all(registro.get('idUnico') in estado['operacoes'] for registro in registros)):
+            ids_inalterados.extend(registro['idUnico'] for registro in registros)
+            continue
+        yield from registros
 
-retries = 10
-engine = None
 
-# URL para conectar ao SERVIDOR (sem DB específico)
-server_engine_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}"
+def normalizar(fontes, estado=None, gravar=True, calcular_hash=True):
+    """
+    Etapa de normalização: lê os registros do cache em lotes e grava as tabelas
+    normalizadas no staging. Com `estado` (modo upsert) as chaves inteiras
+    continuam as do banco e só as páginas alteradas desde a última carga são
+    normalizadas. Com `gravar=False` só normaliza e conta as linhas.
+    `calcular_hash=False` (modo swap) dispensa o hash de cada registro.
 
-for i in range(retries):
+    Retorna {tabela: linhas} e se o staging existente foi reaproveitado.
+    """
+    assinatura_cache = fontes.assinatura()
+    staging = Staging(STAGING_DIR)
+
+    # No upsert o staging só serve se as chaves inteiras dele forem as do banco;
+    # no swap, só se for completo
+    if (gravar and REUSAR_STAGING and staging.mesmas_fontes(fontes)
+            and (staging.com_hash or not calcular_hash)
+            and (staging.chaves_compativeis(estado) if estado is not None else not staging.incremental)):
+        print(f"Cache da API inalterado: reaproveitando o staging Parquet ({STAGING_DIR}).")
+        return {**dict.fromkeys(ORDEM_TABELAS, 0), **staging.manifesto['linhas']}, True
+
+    if estado is None:
+        normalizador = Normalizador(calcular_hash=calcular_hash)
+    else:
+        normalizador = Normalizador(
+            chaves_operacao={id_op: sk for id_op, (sk, _) in estado['operacoes'].items()},
+            orgaos=estado['orgaos'],
+            origens=estado['origens'],
+            calcular_hash=calcular_hash,
+        )
+
+    gravador_staging = GravadorStaging(STAGING_DIR, assinatura=assinatura_cache, ufs=fontes.ufs,
+                                       com_hash=calcular_hash) if gravar else None
+    linhas = dict.fromkeys(ORDEM_TABELAS, 0)
+    paginas, ids_inalterados = [], []
+    registros = registros_alterados(fontes, estado, paginas, ids_inalterados)
+    for numero_lote, lote in enumerate(iter_lotes(registros, TAMANHO_LOTE), start=1):
+        tabelas = normalizador.normaliza(lote)
+        if gravador_staging is not None:
+            gravador_staging.gravar(tabelas)
+        for nome_tabela in ORDEM_TABELAS:
+            linhas[nome_tabela] += len(tabelas[nome_tabela])
+        print(f"Lote nº {numero_lote} normalizado ({linhas['operacoes']} operações até agora).")
+
+    if ids_inalterados:
+        print(f"{len(ids_inalterados)} operações em páginas inalteradas desde a última carga (não normalizadas).")
+
+    if gravador_staging is not None:
+        gravador_staging.paginas = paginas
+        gravador_staging.ids_inalterados = ids_inalterados
+        gravador_staging.concluir()
+        print(f"Staging Parquet atualizado em {STAGING_DIR} ({gravador_staging.lotes} lotes).")
+    return linhas, False
+
+
+def carregar(engine, fontes, estado=None, modo=MODO_PUBLICACAO):
+    """
+    Etapa de carga: aplica os lotes do staging no banco e publica a nova versão.
+      - swap: carrega tabelas-sombra `<nome>__novo` e publica todas com um único
+        RENAME TABLE; o dashboard nunca vê tabelas vazias e uma falha não apaga nada;
+      - upsert: reescreve apenas as operações novas ou alteradas (hash_conteudo)
+        e apaga as que sumiram, numa única transação com os resumos e a versão;
+        as de páginas inalteradas nem estão no staging.
+        Se as tabelas publicadas têm um esquema antigo, publica o staging completo
+        pelo swap (MySQL) ou, nos demais bancos, recria as tabelas só neste ponto.
+    Cada lote do staging é lido e gravado antes do próximo, então o pico de
+    memória depende do tamanho do lote e não do número total de projetos.
+
+    Retorna (versão publicada, total de operações, carregador).
+    """
+    staging = Staging(STAGING_DIR)
+    if staging.manifesto is None:
+        raise RuntimeError(f"Staging não encontrado em {STAGING_DIR}: execute a etapa de normalização antes.")
+    if not staging.formato_atual:
+        raise RuntimeError(f"O staging em {STAGING_DIR} foi gerado por uma versão anterior do ETL: "
+                           "execute a etapa de normalização de novo.")
+    if not staging.mesmas_fontes(fontes):
+        # Carregar o staging de outras UFs (ou de outro conteúdo do cache) apagaria
+        # as operações das UFs pedidas no upsert e publicaria só as do staging no swap
+        raise RuntimeError(f"O staging em {STAGING_DIR} foi gerado a partir de outras fontes "
+                           f"(UFs: {', '.join(staging.ufs or ['?'])}; pedidas: {', '.join(sorted(fontes.ufs))}) "
+                           "ou o cache da API mudou desde a normalização: execute a etapa de normalização de novo.")
+    if modo == 'swap' and not suporta_swap(engine.dialect.name):
+        raise RuntimeError(f"O modo swap precisa do MySQL (banco: {engine.dialect.name}): use o modo upsert.")
+    motivo = motivo_sem_swap(engine, fontes) if modo == 'swap' else None
+    if motivo:
+        raise RuntimeError(f"O modo swap publicaria só parte dos dados ({motivo}): use o modo upsert.")
+
+    metadata_controle.create_all(engine)
+    if modo == 'upsert' and estado is None:
+        estado = preparar_upsert(engine)
+        if estado is None:
+            # Esquema antigo: o staging precisa ter todas as operações
+            if staging.incremental:
+                raise RuntimeError(f"O esquema do banco mudou e o staging em {STAGING_DIR} é incremental: "
+                                   "execute a etapa de normalização de novo.")
+            motivo = motivo_sem_swap(engine, fontes)
+            if motivo:
+                raise RuntimeError(f"O esquema do banco mudou e a carga precisa publicar todos os dados, "
+                                   f"mas esta execução não os tem ({motivo}): execute o ETL com todas "
+                                   "as UFs publicadas e a extração completa.")
+            if suporta_swap(engine.dialect.name):
+                # Tabelas-sombra no esquema novo + RENAME: os dados atuais ficam no ar até a troca
+                print("Publicando o esquema novo pelas tabelas-sombra (swap).")
+                modo = 'swap'
+            else:
+                recriar_tabelas(engine)
+                estado = ler_estado_atual(engine)
+    if modo == 'swap' and staging.incremental:
+        raise RuntimeError(f"O staging em {STAGING_DIR} é incremental (modo upsert) e não serve para o swap: "
+                           "execute a etapa de normalização de novo.")
+    if modo == 'upsert' and estado is not None and not (staging.com_hash and staging.chaves_compativeis(estado)):
+        # Ex.: staging normalizado para o swap, com chaves inteiras próprias e sem hash
+        raise RuntimeError(f"O staging em {STAGING_DIR} não foi normalizado sobre as chaves do banco "
+                           "e não serve para o upsert: execute a etapa de normalização de novo.")
+
+    print(f"\nIniciando carga dos dados no banco (modo: {modo})...")
+    inicio_carga = datetime.now()
+
+    if modo == 'upsert':
+        carregador = CarregadorBulk(engine, metodo=METODO_CARGA, tamanho_lote=TAMANHO_LOTE_INSERT)
+        publicador = PublicadorUpsert(carregador, estado)
+        aplicar_lote = publicador.aplicar
+    else:
+        print("Criando tabelas-sombra no banco de dados...")
+        preparar_tabelas_sombra(engine)
+        carregador = CarregadorBulk(engine, metodo=METODO_CARGA, tamanho_lote=TAMANHO_LOTE_INSERT, sufixo=SUFIXO_NOVO)
+
+        def aplicar_lote(tabelas):
+            for nome_tabela in ORDEM_TABELAS:
+                carregador.carregar(nome_tabela, tabelas[nome_tabela])
+
+    total_operacoes = 0
+
+    # No upsert tudo (lotes, remoções, resumos, páginas e versão) é uma única transação,
+    # confirmada ao sair da sessão: uma falha no meio não deixa dados parcialmente publicados.
+    # No swap cada lote é confirmado nas tabelas-sombra, que só são publicadas pelo RENAME.
+    with carregador.sessao():
+        for numero_lote, tabelas in enumerate(staging.iter_lotes(), start=1):
+            aplicar_lote(tabelas)
+            if modo == 'swap':
+                carregador.commit()
+            total_operacoes += len(tabelas['operacoes'])
+            print(f"Lote nº {numero_lote} carregado ({total_operacoes} operações até agora).")
+
+        if modo == 'upsert':
+            publicador.manter(staging.ids_inalterados())
+            # Só remove o que sumiu das UFs cuja extração chegou ao fim com todas as
+            # páginas no cache (vencidas ou não); senão seria só o que faltou baixar
+            publicador.remover_ausentes(ufs=fontes.ufs_completas())
+            print(f"Operações: {publicador.contagem}")
+
+        # Resumos do dashboard: na mesma transação (upsert) ou nas tabelas-sombra (swap)
+        print("Atualizando tabelas de resumo do dashboard...")
+        atualizar_resumos(carregador.conexao, sufixo=carregador.sufixo)
+
+        # No upsert a nova versão (e o hash das páginas carregadas) é confirmada junto com os dados
+        if modo == 'upsert':
+            registrar_paginas(carregador.conexao, staging.paginas, fontes.ufs)
+            versao = versao_atual(carregador.conexao)
+            # Sem nenhuma operação alterada a versão continua a mesma: os caches do dashboard seguem válidos.
+            # Se uma publicação anterior foi interrompida, os dados podem já não ser os dessa versão.
+            if publicador.alterou or versao is None or publicacao_interrompida(carregador.conexao):
+                # Inclui as operações das páginas inalteradas: é o total publicado, não só o que mudou
+                versao = registrar_execucao(carregador.conexao, modo, len(publicador.vistas), inicio_carga)
+            else:
+                print("Nenhuma operação alterada: a versão dos dados não muda.")
+
+    if modo == 'swap':
+        # O RENAME não entra numa transação: a execução fica pendente até a troca ser registrada
+        with engine.begin() as conn:
+            versao = iniciar_execucao(conn, modo, inicio_carga)
+        publicar_tabelas_sombra(engine)
+        print("Tabelas novas publicadas.")
+        with engine.begin() as conn:
+            registrar_paginas(conn, staging.paginas, fontes.ufs)
+            concluir_execucao(conn, versao, total_operacoes)
+
+    # O dashboard compara esta versão com a do seu cache e recarrega só quando ela muda
+    print(f"Versão dos dados publicada: {versao}")
+    return versao, total_operacoes, carregador
+
+
+def ler_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="ETL dos projetos de investimento: extração, normalização e carga.")
+    parser.add_argument('--stage', choices=ETAPAS + ('todas',), default='todas',
+                        help="Executa só esta etapa (padrão: todas). A normalização lê o cache da API "
+                             "e a carga lê o staging Parquet deixados pelas etapas anteriores.")
+    parser.add_argument('--from-cache', action='store_true',
+                        help="Não consulta a API: usa apenas o que já está no cache.")
+    parser.add_argument('--uf', help="UFs a processar ('DF,GO' ou 'todas'); padrão: ETL_UFS.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Não conecta ao banco nem grava o staging: só extrai, normaliza e conta as linhas.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = ler_argumentos(argv)
     try:
-
-        temp_engine = create_engine(server_engine_url)
-        with temp_engine.connect() as conn:
-            conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {db_name}"))
-            conn.commit()
-        
-        temp_engine.dispose()
-        print(f"Banco de dados '{db_name}' verificado/criado com sucesso.")
-        break
-
-    except OperationalError:
-        print(f"Servidor MySQL ainda não está pronto... tentativa {i+1} de {retries}.")
-        if i < retries - 1:
-            time.sleep(5)
+        ufs = ler_ufs(args.uf) if args.uf else UFS_EXTRACAO
+    except ValueError as e:
+        print(e)
+        return 2
+    etapas = ETAPAS if args.stage == 'todas' else (args.stage,)
+    modo = modo_publicacao()
+
+    relatorio = RelatorioExecucao({
+        'etapas': list(etapas), 'ufs': ufs, 'from_cache': args.from_cache, 'dry_run': args.dry_run,
+        'modo_publicacao': modo, 'tamanho_lote': TAMANHO_LOTE, 'metodo_carga': METODO_CARGA,
+    })
+
+    # O banco é necessário para a carga e para a normalização, que no upsert
+    # parte das chaves do banco. Conecta antes da extração para falhar logo.
+    engine = estado = None
+    if ('carga' in etapas or 'normalizacao' in etapas) and not args.dry_run:
+        engine = conectar_banco()
+
+    linhas = None
+    try:
+        if 'extracao' in etapas:
+            with relatorio.etapa('extracao') as etapa:
+                fontes = extrair(ufs, somente_cache=args.from_cache)
+                etapa['linhas'] = registros_no_cache(fontes)
+                if args.from_cache:
+                    etapa['observacao'] = 'somente cache'
         else:
-            print("Não foi possível conectar ao servidor MySQL após várias tentativas.")
-            exit(1)
-    except Exception as e:
-        print(f"Erro inesperado ao criar/verificar o DB: {e}")
-        exit(1)
-
-# 3. conecta DIRETAMENTE AO BANCO
-try:
-    engine_url = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-    engine = create_engine(engine_url)
-    with engine.connect() as conn:
-        pass 
-    print(f"Conexão com o banco de dados '{db_name}' estabelecida!")
-except Exception as e:
-    print(f"Erro ao conectar ao banco de dados '{db_name}': {e}")
-    exit(1)
-
-
-# Definição da estrutura (Schema) das tabelas
-metadata = MetaData()
-
-# Tabela de Dimensão: Eixos
-eixos_table = Table('eixos', metadata,
-    Column('id_eixo', Integer, primary_key=True),
-    Column('descricao_eixo', String(255))
-)
-
-# Tabela de Dimensão: Tipos
-tipos_table = Table('tipos', metadata,
-    Column('id_tipo', Integer, primary_key=True),
-    Column('descricao_tipo', String(255)),
-    Column('id_eixo', Integer, ForeignKey('eixos.id_eixo'))
-)
-
-# Tabela de Dimensão: Subtipos
-subtipos_table = Table('subtipos', metadata,
-    Column('id_subtipo', Integer, primary_key=True),
-    Column('descricao_subtipo', String(255)),
-    Column('id_tipo', Integer, ForeignKey('tipos.id_tipo'))
-)
-
-# Tabela de Fato: Operacoes
-operacoes_table = Table('operacoes', metadata,
-    Column('id_operacao', String(100), primary_key=True), 
-    Column('valor_investimento_previsto', DECIMAL(15,2)), 
-    Column('tomador_nome', String(255)),
-    Column('tomador_codigo', BIGINT),
-    Column('executor_nome', String(255)),
-    Column('executor_codigo', BIGINT),
-    Column('repassador_nome', String(255)),
-    Column('repassador_codigo', BIGINT),
-    Column('origem_fontes_de_recurso', String(255))
-)
-
-# Tabelas de Ligação Eixo
-operacao_eixo_rel_table = Table('operacao_eixo_rel', metadata,
-    Column('id_operacao', String(100), ForeignKey('operacoes.id_operacao'), primary_key=True),
-    Column('id_eixo', Integer, ForeignKey('eixos.id_eixo'), primary_key=True),
-)
-
-# Tabelas de Ligação Tipo
-operacao_tipo_rel_table = Table('operacao_tipo_rel', metadata,
-    Column('id_operacao', String(100), ForeignKey('operacoes.id_operacao'), primary_key=True),                                
-    Column('id_tipo', Integer, ForeignKey('tipos.id_tipo'), primary_key=True),
-)
-
-# Tabelas de Ligação Subtipo
-operacao_subtipo_rel_table = Table('operacao_subtipo_rel', metadata,
-    Column('id_operacao', String(100), ForeignKey('operacoes.id_operacao'), primary_key=True),
-    Column('id_subtipo', Integer, ForeignKey('subtipos.id_subtipo'), primary_key=True)
-)
-
-
-print("Criando/Verificando tabelas no banco de dados...")
-metadata.create_all(engine)
-
-with engine.connect() as conn:
-    conn.execute(text("SET FOREIGN_KEY_CHECKS = 0;"))
-    conn.execute(text("TRUNCATE TABLE operacao_subtipo_rel;"))
-    conn.execute(text("TRUNCATE TABLE operacao_tipo_rel;"))
-    conn.execute(text("TRUNCATE TABLE operacao_eixo_rel;"))
-    conn.execute(text("TRUNCATE TABLE operacoes;"))
-    conn.execute(text("TRUNCATE TABLE subtipos;"))
-    conn.execute(text("TRUNCATE TABLE tipos;"))
-    conn.execute(text("TRUNCATE TABLE eixos;"))
-    conn.execute(text("SET FOREIGN_KEY_CHECKS = 1;"))
-    conn.commit()
-
-# Populando as tabelas
-print("\nIniciando carga dos dados no MySQL...")
-df_principal_final_filtrado.to_sql('operacoes', con=engine, if_exists='append', index=False)
-df_eixos.to_sql('eixos', con=engine, if_exists='append', index=False)
-df_tipos.to_sql('tipos', con=engine, if_exists='append', index=False)
-df_subtipos.to_sql('subtipos', con=engine, if_exists='append', index=False)
-df_operacaoEixoRel.to_sql('operacao_eixo_rel', con=engine, if_exists='append', index=False)
-df_operacaoTipoRel.to_sql('operacao_tipo_rel', con=engine, if_exists='append', index=False)
-df_operacaoSubtipoRel.to_sql('operacao_subtipo_rel', con=engine, if_exists='append', index=False)
-
-print("Carga de dados concluída com sucesso!")
\ No newline at end of file
+            # As etapas seguintes leem o que já está no cache, sem consultar a API
+            fontes = extrair(ufs, somente_cache=True)
+
+        if engine is not None:
+            motivo = motivo_sem_swap(engine, fontes) if modo == 'swap' else None
+            if motivo:
+                print(f"O modo swap publicaria só parte dos dados ({motivo}). Usando o modo upsert nesta execução.")
+                modo = relatorio.parametros['modo_publicacao'] = 'upsert'
+            if modo == 'upsert':
+                estado = preparar_upsert(engine)
+
+        if 'normalizacao' in etapas:
+            with relatorio.etapa('normalizacao') as etapa:
+                linhas, reaproveitado = normalizar(fontes, estado, gravar=not args.dry_run,
+                                                   calcular_hash=modo == 'upsert')
+                etapa['linhas'] = linhas['operacoes']
+                if reaproveitado:
+                    etapa['observacao'] = 'staging reaproveitado'
+                print("Linhas normalizadas por tabela: "
+                      + ", ".join(f"{nome}={total}" for nome, total in linhas.items()))
+
+        if 'carga' in etapas:
+            with relatorio.etapa('carga') as etapa:
+                if args.dry_run:
+                    # O que seria carregado: o que acabou de ser normalizado ou o staging existente
+                    if linhas is None:
+                        staging = Staging(STAGING_DIR)
+                        linhas = staging.manifesto['linhas'] if staging.manifesto else {}
+                    etapa['linhas'] = linhas.get('operacoes', 0)
+                    etapa['observacao'] = 'dry-run: banco não alterado'
+                else:
+                    versao, etapa['linhas'], carregador = carregar(engine, fontes, estado, modo)
+                    etapa['observacao'] = f"versão {versao}"
+                    carregador.imprimir_relatorio()
+    finally:
+        relatorio.imprimir()
+        print(f"Relatório salvo em {relatorio.salvar(RELATORIOS_DIR)}")
+        if engine is not None:
+            engine.dispose()
+
+    print("Carga de dados concluída com sucesso!" if 'carga' in etapas and not args.dry_run
+          else "Etapas concluídas.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
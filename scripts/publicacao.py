@@ -0,0 +1,249 @@
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+from esquema import etl_runs_table, metadata, metadata_com_sufixo, paginas_api_table
+
+## Publicação da carga: troca atômica de tabelas-sombra ou upsert incremental
+
+MODOS_PUBLICACAO = ('swap', 'upsert')
+
+SUFIXO_NOVO = '__novo'
+SUFIXO_ANTIGO = '__antigo'
+
+# Tabelas de dimensão, na ordem de carga
+DIMENSOES = ['eixos', 'tipos', 'subtipos', 'orgaos', 'origens_recurso']
+
+# Tabelas de ligação (todas apontam para a operação por `sk_operacao`)
+RELACOES = [
+    'operacao_eixo_rel',
+    'operacao_tipo_rel',
+    'operacao_subtipo_rel',
+    'operacao_tomador_rel',
+    'operacao_executor_rel',
+    'operacao_repassador_rel',
+    'operacao_fonte_rel',
+]
+
+
+# --- Modo swap ---
+
+def suporta_swap(dialeto):
+    """
+    O swap depende do `RENAME TABLE a TO b, c TO d` atômico do MySQL (e de nomes
+    de índice por tabela); SQLite e outros bancos só publicam por upsert.
+    """
+    return dialeto == 'mysql'
+
+
+def preparar_tabelas_sombra(engine):
+    """
+    Cria vazias as tabelas `<nome>__novo`, descartando sobras de uma execução
+    interrompida. As tabelas publicadas não são tocadas.
+    """
+    sombra = metadata_com_sufixo(SUFIXO_NOVO)
+    metadata_com_sufixo(SUFIXO_ANTIGO).drop_all(engine)
+
+
+def ufs_publicadas(engine):
+    """UFs com operações nas tabelas publicadas (vazio se elas ainda não existem)."""
+    try:
+        with engine.connect() as conn:
+            return {uf for uf, in conn.execute(text("SELECT DISTINCT uf FROM operacoes")) if uf is not None}
+    except DBAPIError:
+        return set()
+    sombra.drop_all(engine)
+    sombra.create_all(engine)
+    return sombra
+
+
+def publicar_tabelas_sombra(engine):
+    """
+    Troca todas as tabelas de uma vez com um único `RENAME TABLE` (atômico no
+    MySQL): o dashboard vê a versão anterior completa ou a nova completa, nunca
+    tabelas vazias ou pela metade. Em seguida descarta as versões antigas.
+    """
+    inspetor = inspect(engine)
+    renomeacoes = []
+    for tabela in metadata.sorted_tables:
+        if inspetor.has_table(tabela.name):
+            renomeacoes.append(f"{tabela.name} TO {tabela.name}{SUFIXO_ANTIGO}")
+        renomeacoes.append(f"{tabela.name}{SUFIXO_NOVO} TO {tabela.name}")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("RENAME TABLE " + ", ".join(renomeacoes))
+
+    metadata_com_sufixo(SUFIXO_ANTIGO).drop_all(engine)
+
+
+def ufs_publicadas(engine):
+    """UFs com operações nas tabelas publicadas (vazio se elas ainda não existem)."""
+    try:
+        with engine.connect() as conn:
+            return {uf for uf, in conn.execute(text("SELECT DISTINCT uf FROM operacoes")) if uf is not None}
+    except DBAPIError:
+        return set()
+
+
+# --- Modo upsert ---
+
+def ler_estado_atual(engine):
+    """
+    Lê do banco o que a carga incremental precisa para manter as chaves estáveis:
+    {id_operacao: (sk_operacao, hash_conteudo)}, a UF de cada operação, órgãos e
+    origens já cadastrados e o hash das páginas da API já publicadas
+    {(uf, pagina): hash_pagina}.
+    """
+    with engine.connect() as conn:
+        operacoes = conn.execute(text("SELECT id_operacao, sk_operacao, hash_conteudo, uf FROM operacoes")).all()
+        orgaos = conn.execute(text("SELECT codigo, nome, id_orgao FROM orgaos")).all()
+        origens = conn.execute(text("SELECT descricao_origem, id_origem FROM origens_recurso")).all()
+        paginas = conn.execute(text("SELECT uf, pagina, hash_pagina FROM paginas_api")).all()
+
+    return {
+        'operacoes': {id_op: (sk, hash_) for id_op, sk, hash_, _ in operacoes},
+        'ufs': {id_op: uf for id_op, _, _, uf in operacoes},
+        'orgaos': {(codigo, nome): id_orgao for codigo, nome, id_orgao in orgaos},
+        'origens': {descricao: id_origem for descricao, id_origem in origens},
+        'paginas': {(uf, pagina): hash_ for uf, pagina, hash_ in paginas},
+    }
+
+
+class PublicadorUpsert:
+    """
+    Aplica cada lote normalizado sobre as tabelas publicadas, reescrevendo só
+    as operações novas ou cujo `hash_conteudo` mudou. As operações de páginas
+    da API que nem foram normalizadas (inalteradas) entram por `manter`. Ao
+    final, `remover_ausentes` apaga as operações que não vieram nesta execução.
+    """
+
+    def __init__(self, carregador, estado):
+        self.carregador = carregador
+        self.anteriores = estado['operacoes']
+        self.ufs_anteriores = estado['ufs']
+        self.vistas = set()
+        self.contagem = {'inseridas': 0, 'atualizadas': 0, 'inalteradas': 0, 'removidas': 0}
+
+    def aplicar(self, tabelas):
+        operacoes = tabelas['operacoes']
+        self.vistas.update(operacoes['id_operacao'])
+
+        hash_anterior = operacoes['id_operacao'].map(lambda id_op: self.anteriores.get(id_op, (None, None))[1])
+        alteradas = operacoes[hash_anterior != operacoes['hash_conteudo']]
+        existentes = alteradas[alteradas['id_operacao'].isin(self.anteriores.keys())]
+
+        self.contagem['inalteradas'] += len(operacoes) - len(alteradas)
+        self.contagem['atualizadas'] += len(existentes)
+        self.contagem['inseridas'] += len(alteradas) - len(existentes)
+
+        for nome_tabela in DIMENSOES:
+            self.carregador.carregar(nome_tabela, tabelas[nome_tabela], upsert=True)
+
+        if alteradas.empty:
+            return
+
+        # Ligações antigas das operações alteradas são substituídas pelas novas
+        for nome_tabela in RELACOES:
+            self.carregador.excluir(nome_tabela, 'sk_operacao', existentes['sk_operacao'].tolist())
+
+        self.carregador.carregar('operacoes', alteradas, upsert=True)
+
+        chaves_alteradas = set(alteradas['sk_operacao'])
+        for nome_tabela in RELACOES:
+            df = tabelas[nome_tabela]
+            self.carregador.carregar(nome_tabela, df[df['sk_operacao'].isin(chaves_alteradas)])
+
+    @property
+    def alterou(self):
+        """True se alguma operação foi inserida, atualizada ou removida."""
+        return any(self.contagem[chave] for chave in ('inseridas', 'atualizadas', 'removidas'))
+
+    def manter(self, ids_operacao):
+        """Operações de páginas inalteradas: continuam como estão e não são removidas."""
+        ids_operacao = set(ids_operacao) - self.vistas
+        self.vistas.update(ids_operacao)
+        self.contagem['inalteradas'] += len(ids_operacao)
+
+    def remover_ausentes(self, ufs=None):
+        """
+        Apaga operações (e suas ligações) que existiam no banco e não vieram nesta
+        execução. Com `ufs`, só considera as operações dessas UFs: as demais não
+        foram extraídas agora e continuam como estão.
+        """
+        ausentes = [id_op for id_op in self.anteriores
+                    if id_op not in self.vistas and (ufs is None or self.ufs_anteriores.get(id_op) in ufs)]
+        if not ausentes:
+            return
+        chaves = [self.anteriores[id_op][0] for id_op in ausentes]
+        for nome_tabela in RELACOES:
+            self.carregador.excluir(nome_tabela, 'sk_operacao', chaves)
+        self.carregador.excluir('operacoes', 'id_operacao', ausentes)
+        self.contagem['removidas'] += len(ausentes)
+
+
+# --- Versão dos dados ---
+
+def registrar_paginas(conexao, paginas, ufs):
+    """
+    Substitui os hashes das páginas publicadas das `ufs` pelos de `paginas`
+    ([uf, pagina, hash, registros] do staging carregado). Deve rodar junto com
+    a publicação dos dados (mesma transação no upsert; após o RENAME no swap).
+    """
+    conexao.execute(paginas_api_table.delete().where(paginas_api_table.c.uf.in_(list(ufs))))
+    linhas = [{'uf': uf, 'pagina': pagina, 'hash_pagina': hash_, 'registros': registros}
+              for uf, pagina, hash_, registros in paginas]
+    if linhas:
+        conexao.execute(paginas_api_table.insert(), linhas)
+
+
+def versao_atual(conexao):
+    """
+    Maior `id_execucao` concluído de `etl_runs` (versão publicada), ou None se
+    ainda não houve carga.
+    """
+    return conexao.execute(
+        select(func.max(etl_runs_table.c.id_execucao)).where(etl_runs_table.c.concluida_em.isnot(None))
+    ).scalar()
+
+
+def publicacao_interrompida(conexao):
+    """
+    True se uma publicação começou depois da versão atual e não foi concluída
+    (ver `iniciar_execucao`): os dados no banco podem não ser mais os dessa versão.
+    """
+    versao = versao_atual(conexao)
+    pendentes = select(func.count()).select_from(etl_runs_table).where(etl_runs_table.c.concluida_em.is_(None))
+    if versao is not None:
+        pendentes = pendentes.where(etl_runs_table.c.id_execucao > versao)
+    return conexao.execute(pendentes).scalar() > 0
+
+
+def iniciar_execucao(conexao, modo, iniciada_em):
+    """
+    Grava em `etl_runs` uma carga ainda não concluída (`concluida_em` nulo) e
+    devolve o `id_execucao`. No swap é confirmada antes do RENAME: se o processo
+    cair entre a troca das tabelas e `concluir_execucao`, a próxima carga sabe
+    que os dados publicados mudaram sem uma nova versão.
+    """
+    resultado = conexao.execute(etl_runs_table.insert().values(modo=modo, iniciada_em=iniciada_em))
+    return resultado.inserted_primary_key[0]
+
+
+def concluir_execucao(conexao, id_execucao, num_operacoes):
+    """Marca a carga `id_execucao` como concluída: ela passa a ser a versão vista pelo dashboard."""
+    conexao.execute(etl_runs_table.update().where(etl_runs_table.c.id_execucao == id_execucao).values(
+        num_operacoes=num_operacoes, concluida_em=datetime.now(),
+    ))
+
+
+def registrar_execucao(conexao, modo, num_operacoes, iniciada_em):
+    """
+    Grava a carga já concluída em `etl_runs` e devolve o `id_execucao`, que
+    passa a ser a versão dos dados vista pelo dashboard. Deve rodar na
+    transação da carga (upsert).
+    """
+    resultado = conexao.execute(etl_runs_table.insert().values(
+        modo=modo, num_operacoes=num_operacoes, iniciada_em=iniciada_em, concluida_em=datetime.now(),
+    ))
+    return resultado.inserted_primary_key[0]
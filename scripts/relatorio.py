@@ -0,0 +1,92 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+## Relatório de execução do ETL: tempo, linhas e pico de memória de cada etapa
+RELATORIOS_DIR = 'relatorios'
+
+
+def _zerar_pico_rss():
+    """Zera o pico de memória do processo (Linux), para medir cada etapa separadamente."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def pico_rss_mb():
+    """
+    Pico de memória residente (MB). No Linux lê o VmHWM, que `_zerar_pico_rss`
+    reinicia; nos demais sistemas é o pico desde o início do processo.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return round(int(linha.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class RelatorioExecucao:
+    """
+    Acumula uma linha por etapa executada. Uso:
+
+        with relatorio.etapa('normalizacao') as etapa:
+            ...
+            etapa['linhas'] = total
+
+    A etapa pode anotar também `etapa['observacao']` (ex.: 'staging reaproveitado').
+    """
+
+    def __init__(self, parametros=None):
+        self.parametros = dict(parametros or {})
+        self.iniciada_em = datetime.now()
+        self.etapas = []
+
+    @contextmanager
+    def etapa(self, nome):
+        _zerar_pico_rss()
+        registro = {'etapa': nome, 'linhas': None, 'segundos': None, 'pico_rss_mb': None, 'observacao': ''}
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except Exception as e:
+            registro['observacao'] = f"erro: {e}"
+            raise
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 3)
+            registro['pico_rss_mb'] = pico_rss_mb()
+            self.etapas.append(registro)
+
+    def tabela(self):
+        return pd.DataFrame(self.etapas, columns=['etapa', 'linhas', 'segundos', 'pico_rss_mb', 'observacao'])
+
+    def imprimir(self):
+        print("\nRelatório da execução (por etapa):")
+        print(self.tabela().to_string(index=False))
+
+    def salvar(self, diretorio=RELATORIOS_DIR):
+        """Grava o relatório em `<diretorio>/execucao_<data>.json` e devolve o caminho."""
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, f"execucao_{self.iniciada_em:%Y%m%d_%H%M%S}.json")
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump({
+                'iniciada_em': self.iniciada_em.isoformat(timespec='seconds'),
+                'parametros': self.parametros,
+                'etapas': self.etapas,
+            }, f, indent=2, ensure_ascii=False, default=str)
+        return caminho
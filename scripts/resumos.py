@@ -0,0 +1,141 @@
+import unicodedata
+
+## Tabelas de resumo pré-agregadas lidas pelo dashboard
+
+# Quantos tomadores são guardados em `resumo_top_tomadores`
+TOP_TOMADORES = 100
+
+# Tabelas reconstruídas a cada carga (definidas em `esquema.py`)
+TABELAS_RESUMO = [
+    'resumo_kpis',
+    'resumo_eixos',
+    'resumo_tipos',
+    'resumo_top_tomadores',
+]
+
+
+# Separador dos rótulos de eixo/tipo de uma operação ('Eixo A, Eixo B')
+SEPARADOR_ROTULOS = ', '
+
+
+def _rotulos(dialeto, coluna, origem):
+    """
+    Subconsulta com os valores distintos de `coluna` (FROM/WHERE em `origem`,
+    a partir de uma quebra de linha) ordenados e concatenados. O SQLite não aceita separador nem ORDER BY num
+    GROUP_CONCAT(DISTINCT ...): ordena numa subconsulta derivada.
+    """
+    if dialeto == 'mysql':
+        return f"SELECT GROUP_CONCAT(DISTINCT {coluna} ORDER BY {coluna} SEPARATOR '{SEPARADOR_ROTULOS}'){origem}"
+    return (f"SELECT GROUP_CONCAT(rotulo, '{SEPARADOR_ROTULOS}') "
+            f"FROM (SELECT DISTINCT {coluna} AS rotulo{origem} ORDER BY rotulo)")
+
+
+def _peso_utf8mb4_0900_ai_ci(texto):
+    """
+    Aproxima a ordenação da collation padrão do MySQL 8 (utf8mb4_0900_ai_ci):
+    sem diferença de acento nem de caixa, espaços e pontuação antes dos
+    dígitos e dígitos antes das letras.
+    """
+    sem_acento = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return tuple((0 if not c.isalnum() else 1 if c.isdigit() else 2, c) for c in sem_acento.casefold())
+
+
+def chave_rotulos(dialeto):
+    """
+    Chave que ordena (e define quais são iguais no DISTINCT) os rótulos como
+    o GROUP_CONCAT de `sql_base_operacoes` faz no banco: a collation das colunas
+    no MySQL e a comparação binária (ordem dos code points) nos demais.
+    """
+    if dialeto == 'mysql':
+        return _peso_utf8mb4_0900_ai_ci
+    return lambda texto: texto
+
+
+def sql_base_operacoes(dialeto, sufixo='', filtro='', ordem='', limite=None):
+    """
+    Uma linha por operação com os rótulos de eixo/tipo concatenados, igual à
+    consulta usada pelo dashboard (nulos viram 'Não Categorizado'/'Não Informada').
+
+    Os rótulos saem de subconsultas correlacionadas (pela PK das tabelas de
+    ligação), então com `filtro` (condição SQL sobre `op`) só as operações
+    filtradas são processadas; com `ordem`/`limite` (ORDER BY/LIMIT sobre `op`)
+    só as da página pedida.
+    """
+    where = f"WHERE {filtro}" if filtro else ""
+    order_by = f"ORDER BY {ordem}" if ordem else ""
+    limit = f"LIMIT {int(limite)}" if limite is not None else ""
+    eixos = _rotulos(dialeto, 'e.descricao_eixo', f"""
+            FROM operacao_eixo_rel{sufixo} oe
+            JOIN eixos{sufixo} e ON oe.id_eixo = e.id_eixo
+            WHERE oe.sk_operacao = op.sk_operacao""")
+    tipos = _rotulos(dialeto, 't.descricao_tipo', f"""
+            FROM operacao_tipo_rel{sufixo} otr
+            JOIN tipos{sufixo} t ON otr.id_tipo = t.id_tipo
+            WHERE otr.sk_operacao = op.sk_operacao""")
+    return f"""
+    SELECT
+        op.id_operacao,
+        op.uf,
+        op.valor_investimento_previsto,
+        op.tomador_nome,
+        COALESCE(op.origem_fontes_de_recurso, 'Não Informada') AS origem_fontes_de_recurso,
+        COALESCE(({eixos}), 'Não Categorizado') AS eixo_descricao,
+        COALESCE(({tipos}), 'Não Categorizado') AS tipo_descricao
+    FROM operacoes{sufixo} op
+    {where}
+    {order_by}
+    {limit}
+    """
+
+
+def atualizar_resumos(conexao, sufixo=''):
+    """
+    Recalcula as tabelas de resumo `<resumo><sufixo>` a partir das tabelas
+    `<nome><sufixo>`, tudo dentro do servidor (INSERT ... SELECT). Deve rodar na
+    mesma transação da carga: quem lê o banco continua vendo os resumos
+    anteriores até o commit.
+    """
+    dialeto = conexao.dialect.name
+    base = sql_base_operacoes(dialeto, sufixo)
+
+    for tabela in TABELAS_RESUMO:
+        conexao.exec_driver_sql(f"DELETE FROM {tabela}{sufixo}")
+
+    conexao.exec_driver_sql(f"""
+    INSERT INTO resumo_kpis{sufixo}
+        (valor_total, num_operacoes, valor_medio, num_eixos, num_tipos, num_origens)
+    SELECT
+        COALESCE(SUM(valor_investimento_previsto), 0),
+        COUNT(*),
+        AVG(valor_investimento_previsto),
+        COUNT(DISTINCT eixo_descricao),
+        COUNT(DISTINCT tipo_descricao),
+        COUNT(DISTINCT origem_fontes_de_recurso)
+    FROM ({base}) b
+    """)
+
+    conexao.exec_driver_sql(f"""
+    INSERT INTO resumo_eixos{sufixo} (eixo_descricao, valor_investimento_previsto, num_operacoes)
+    SELECT eixo_descricao, COALESCE(SUM(valor_investimento_previsto), 0), COUNT(*)
+    FROM ({base}) b
+    GROUP BY eixo_descricao
+    """)
+
+    conexao.exec_driver_sql(f"""
+    INSERT INTO resumo_tipos{sufixo} (tipo_descricao, valor_investimento_previsto, num_operacoes)
+    SELECT tipo_descricao, COALESCE(SUM(valor_investimento_previsto), 0), COUNT(*)
+    FROM ({base}) b
+    GROUP BY tipo_descricao
+    """)
+
+    # Tomadores vêm da tabela de ligação: todos os tomadores de cada operação contam
+    conexao.exec_driver_sql(f"""
+    INSERT INTO resumo_top_tomadores{sufixo} (tomador_nome, valor_investimento_previsto, num_operacoes)
+    SELECT org.nome, COALESCE(SUM(op.valor_investimento_previsto), 0), COUNT(*)
+    FROM operacao_tomador_rel{sufixo} otr
+    JOIN orgaos{sufixo} org ON otr.id_orgao = org.id_orgao
+    JOIN operacoes{sufixo} op ON otr.sk_operacao = op.sk_operacao
+    GROUP BY org.id_orgao, org.nome
+    ORDER BY 2 DESC
+    LIMIT {TOP_TOMADORES}
+    """)
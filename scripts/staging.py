@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, Integer, SmallInteger
+
+from esquema import metadata
+from normalizacao import ORDEM_TABELAS
+
+## Área de staging em Parquet entre a normalização e o MySQL
+STAGING_DIR = 'staging'
+MANIFESTO = '_staging.json'
+# ids das operações de páginas inalteradas (carga incremental), que não foram normalizadas
+INALTERADAS = '_inalteradas.parquet'
+# Versão do layout das tabelas; um staging de outra versão não é reaproveitado
+# (2: todas as tabelas de ligação por `sk_operacao`)
+FORMATO = 2
+
+
+def tipos_compactos(nome_tabela):
+    """
+    dtype de cada coluna inteira conforme o esquema (Int16/Int32/Int64 anuláveis).
+    Textos ficam como estão: o Parquet já grava com codificação de dicionário.
+    """
+    tipos = {}
+    for coluna in metadata.tables[nome_tabela].columns:
+        if isinstance(coluna.type, BigInteger):
+            tipos[coluna.name] = 'Int64'
+        elif isinstance(coluna.type, SmallInteger):
+            tipos[coluna.name] = 'Int16'
+        elif isinstance(coluna.type, Integer):
+            tipos[coluna.name] = 'Int32'
+    return tipos
+
+
+def compactar(nome_tabela, df):
+    tipos = {coluna: tipo for coluna, tipo in tipos_compactos(nome_tabela).items() if coluna in df.columns}
+    return df.astype(tipos)
+
+
+class GravadorStaging:
+    """
+    Grava cada lote normalizado em `<diretorio>/<tabela>/lote_NNNNN.parquet`.
+
+    Tudo é escrito em `<diretorio>.novo` e só substitui o staging anterior em
+    `concluir()`, então uma execução interrompida não deixa um staging pela
+    metade. `assinatura` identifica o cache da API que deu origem aos dados e
+    `ufs` as UFs extraídas; a carga só aceita o staging das mesmas fontes.
+
+    Na carga incremental só as páginas alteradas são normalizadas: as
+    operações das demais entram em `ids_inalterados` e o staging deixa de ser
+    uma cópia completa (`incremental` no manifesto).
+    """
+
+    def __init__(self, diretorio=STAGING_DIR, assinatura=None, ufs=None, com_hash=True):
+        self.diretorio = diretorio
+        self.temporario = diretorio + '.novo'
+        self.assinatura = assinatura
+        self.ufs = sorted(ufs) if ufs is not None else None
+        # Se `hash_conteudo` foi calculado (ver `Normalizador`)
+        self.com_hash = com_hash
+        self.lotes = 0
+        self.linhas = {}
+        # [uf, pagina, hash, registros] de cada página da API lida (alterada ou não)
+        self.paginas = []
+        self.ids_inalterados = []
+        shutil.rmtree(self.temporario, ignore_errors=True)
+        for nome_tabela in ORDEM_TABELAS:
+            os.makedirs(os.path.join(self.temporario, nome_tabela))
+
+    def gravar(self, tabelas):
+        """Grava o lote e devolve as tabelas já com os dtypes compactos."""
+        self.lotes += 1
+        compactas = {}
+        for nome_tabela in ORDEM_TABELAS:
+            df = compactas[nome_tabela] = compactar(nome_tabela, tabelas[nome_tabela])
+            df.to_parquet(os.path.join(self.temporario, nome_tabela, f'lote_{self.lotes:05d}.parquet'), index=False)
+            self.linhas[nome_tabela] = self.linhas.get(nome_tabela, 0) + len(df)
+        return compactas
+
+    def concluir(self):
+        if self.ids_inalterados:
+            pd.DataFrame({'id_operacao': self.ids_inalterados}).to_parquet(
+                os.path.join(self.temporario, INALTERADAS), index=False)
+        manifesto = {
+            'assinatura': self.assinatura,
+            'formato': FORMATO,
+            'ufs': self.ufs,
+            'com_hash': self.com_hash,
+            'lotes': self.lotes,
+            'linhas': self.linhas,
+            'incremental': bool(self.ids_inalterados),
+            'inalteradas': len(self.ids_inalterados),
+            'paginas': self.paginas,
+            'criado_em': time.time(),
+        }
+        with open(os.path.join(self.temporario, MANIFESTO), 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2)
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        os.replace(self.temporario, self.diretorio)
+
+
+class Staging:
+    """Leitura do staging concluído (Parquet mapeado em memória)."""
+
+    def __init__(self, diretorio=STAGING_DIR):
+        self.diretorio = diretorio
+        self.manifesto = None
+        caminho = os.path.join(diretorio, MANIFESTO)
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as f:
+                self.manifesto = json.load(f)
+
+    def valido_para(self, assinatura):
+        """True se o staging foi gerado a partir do cache da API com esta assinatura (e no formato atual)."""
+        return self.formato_atual and self.manifesto['assinatura'] == assinatura
+
+    @property
+    def formato_atual(self):
+        """True se há staging concluído no layout atual das tabelas (`FORMATO`)."""
+        return self.manifesto is not None and self.manifesto.get('formato') == FORMATO
+
+    @property
+    def incremental(self):
+        """True se o staging só tem as operações alteradas (ver `GravadorStaging`)."""
+        return bool(self.manifesto and self.manifesto.get('incremental'))
+
+    @property
+    def ufs(self):
+        """UFs extraídas na geração do staging (None se não registradas)."""
+        return self.manifesto.get('ufs') if self.manifesto else None
+
+    def mesmas_fontes(self, fontes):
+        """
+        True se o staging foi gerado das mesmas UFs e do mesmo conteúdo do
+        cache que `fontes` (`agendador.AgendadorUFs`).
+        """
+        return self.ufs == sorted(fontes.ufs) and self.valido_para(fontes.assinatura())
+
+    @property
+    def com_hash(self):
+        return bool(self.manifesto and self.manifesto.get('com_hash', True))
+
+    @property
+    def paginas(self):
+        return self.manifesto.get('paginas', []) if self.manifesto else []
+
+    def ids_inalterados(self):
+        caminho = os.path.join(self.diretorio, INALTERADAS)
+        if not os.path.exists(caminho):
+            return []
+        return self._ler(caminho)['id_operacao'].tolist()
+
+    def _ler(self, caminho, colunas=None):
+        return pq.read_table(caminho, columns=colunas, memory_map=True).to_pandas()
+
+    def iter_lotes(self):
+        """Devolve os lotes na ordem em que foram gravados, no formato de `Normalizador.normaliza`."""
+        for lote in range(1, self.manifesto['lotes'] + 1):
+            yield {
+                nome_tabela: self._ler(os.path.join(self.diretorio, nome_tabela, f'lote_{lote:05d}.parquet'))
+                for nome_tabela in ORDEM_TABELAS
+            }
+
+    def ler_tabela(self, nome_tabela, colunas=None):
+        """Tabela inteira (todos os lotes), opcionalmente só com `colunas`."""
+        if not self.manifesto['lotes']:
+            # Carga incremental sem nenhuma página alterada: diretórios vazios
+            colunas = colunas or [coluna.name for coluna in metadata.tables[nome_tabela].columns]
+            return compactar(nome_tabela, pd.DataFrame(columns=colunas))
+        return self._ler(os.path.join(self.diretorio, nome_tabela), colunas)
+
+    def chaves_compativeis(self, estado):
+        """
+        True se as chaves inteiras do staging (sk_operacao, id_orgao, id_origem)
+        batem com as do banco (`publicacao.ler_estado_atual`) e as operações
+        inalteradas ainda estão lá. Só assim o staging pode ser reaplicado no
+        modo upsert sem normalizar de novo.
+        """
+        operacoes = self.ler_tabela('operacoes', ['id_operacao', 'sk_operacao'])
+        orgaos = _sem_nulos(self.ler_tabela('orgaos', ['codigo', 'nome', 'id_orgao']))
+        origens = self.ler_tabela('origens_recurso', ['descricao_origem', 'id_origem'])
+
+        return (
+            # Operações inalteradas não estão no staging: precisam continuar no banco
+            all(id_op in estado['operacoes'] for id_op in self.ids_inalterados())
+            and _compativeis(zip(operacoes['id_operacao'], operacoes['sk_operacao']),
+                         {id_op: sk for id_op, (sk, _) in estado['operacoes'].items()})
+            and _compativeis(zip(zip(orgaos['codigo'], orgaos['nome']), orgaos['id_orgao']), estado['orgaos'])
+            and _compativeis(zip(origens['descricao_origem'], origens['id_origem']), estado['origens'])
+        )
+
+
+def _sem_nulos(df):
+    return df.astype(object).where(df.notna(), None)
+
+
+def _compativeis(pares, banco):
+    """Cada chave natural tem o mesmo id nos dois lados e nenhum id aponta para chaves diferentes."""
+    chave_por_id = {id_: chave for chave, id_ in banco.items()}
+    for chave, id_ in pares:
+        if banco.get(chave, id_) != id_ or chave_por_id.get(id_, chave) != chave:
+            return False
+    return True
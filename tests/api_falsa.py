@@ -0,0 +1,90 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from extracao import TokenBucket
+
+## API falsa usada pelos testes de extração e de carga
+
+
+class ServidorFalso:
+    """
+    API `projeto-investimento` de mentira: `paginas[uf]` é a lista de páginas
+    (a seguinte vem vazia) e `recusas[(uf, pagina)]` os (status, Retry-After)
+    devolvidos antes da resposta normal. Cada página responde com um atraso
+    aleatório, para que as respostas concorrentes cheguem fora de ordem.
+    """
+
+    def __init__(self, paginas, recusas=None):
+        self.paginas = paginas
+        self.recusas = {chave: list(lista) for chave, lista in (recusas or {}).items()}
+        self.requisicoes = []
+        self.trava = threading.Lock()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                uf, pagina = params['uf'][0], int(params['pagina'][0])
+                with servidor.trava:
+                    servidor.requisicoes.append((uf, pagina, time.monotonic()))
+                    pendentes = servidor.recusas.get((uf, pagina))
+                    recusa = pendentes.pop(0) if pendentes else None
+                if recusa:
+                    status, retry_after = recusa
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header('Retry-After', str(retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                time.sleep(random.uniform(0, 0.05))
+                paginas = servidor.paginas.get(uf, [])
+                conteudo = paginas[pagina] if pagina < len(paginas) else []
+                corpo = json.dumps({'content': conteudo}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.http.server_address[1]}/projeto-investimento'
+
+    def __enter__(self):
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.http.shutdown()
+        self.http.server_close()
+
+    def contagem(self, uf, pagina):
+        return sum(1 for u, p, _ in self.requisicoes if (u, p) == (uf, pagina))
+
+
+def projeto(id_unico, uf, valor=1000.0, eixo=1):
+    """Registro da API com os campos que a normalização usa."""
+    return {
+        'idUnico': id_unico,
+        'uf': uf,
+        'eixos': [{'id': eixo, 'descricao': f'Eixo {eixo}'}],
+        'tipos': [{'id': 10 + eixo, 'descricao': f'Tipo {10 + eixo}', 'idEixo': eixo}],
+        'tomadores': [{'codigo': 100, 'nome': 'ORGAO 100'}],
+        'fontesDeRecurso': [{'origem': 'Federal', 'valorInvestimentoPrevisto': valor}],
+    }
+
+
+def paginas_de(uf, quantidade, por_pagina=3):
+    return [[projeto(f'{uf}-{p}-{i}', uf) for i in range(por_pagina)] for p in range(quantidade)]
+
+
+def limitador_rapido():
+    return TokenBucket(taxa=200, capacidade=20, taxa_maxima=200)
@@ -0,0 +1,184 @@
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import agendador
+import processa_dados
+from api_falsa import ServidorFalso, limitador_rapido, paginas_de, projeto
+from carga import CarregadorBulk
+from esquema import metadata
+from publicacao import iniciar_execucao, versao_atual
+from staging import Staging
+
+
+@pytest.fixture
+def etl(tmp_path, monkeypatch):
+    """Banco SQLite e staging temporários; a extração usa a API falsa sem limite de taxa."""
+    monkeypatch.setattr(processa_dados, 'STAGING_DIR', str(tmp_path / 'staging'))
+    monkeypatch.setattr(agendador, 'TokenBucket', limitador_rapido)
+    # `executar` aponta a extração para o servidor falso de cada teste; restaurado ao final
+    monkeypatch.setattr(processa_dados, 'API_URL', processa_dados.API_URL)
+    engine = create_engine(f"sqlite:///{tmp_path / 'etl.db'}")
+    yield engine
+    engine.dispose()
+
+
+def executar(engine, servidor, cache_dir, ufs=('DF', 'GO'), ttl=None):
+    """Extração, normalização e carga no modo upsert, como `processa_dados.main`."""
+    processa_dados.API_URL = servidor.url
+    fontes = processa_dados.get_data_from_api_or_cache(list(ufs), cache_dir=str(cache_dir), ttl=ttl)
+    estado = processa_dados.preparar_upsert(engine)
+    _, reaproveitado = processa_dados.normalizar(fontes, estado)
+    versao, _, _ = processa_dados.carregar(engine, fontes, estado, modo='upsert')
+    return versao, reaproveitado
+
+
+def operacoes(engine):
+    with engine.connect() as conn:
+        linhas = conn.execute(text("SELECT id_operacao, valor_investimento_previsto FROM operacoes")).all()
+    return {id_op: float(valor) for id_op, valor in linhas}
+
+
+def consultar(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(text(sql)).scalar()
+
+
+@pytest.fixture
+def api():
+    paginas = {'DF': paginas_de('DF', 2), 'GO': paginas_de('GO', 2)}
+    with ServidorFalso(paginas) as servidor:
+        yield servidor
+
+
+def test_upsert_insere_atualiza_e_remove(etl, api, tmp_path):
+    executar(etl, api, tmp_path / 'cache')
+    assert len(operacoes(etl)) == 12
+
+    api.paginas['DF'][0][0] = projeto('DF-0-0', 'DF', valor=5000.0, eixo=2)
+    api.paginas['GO'][1].pop()
+    api.paginas['GO'][1].append(projeto('GO-novo', 'GO'))
+    # ttl=0: todas as páginas vencidas são baixadas de novo, e as remoções continuam valendo
+    executar(etl, api, tmp_path / 'cache', ttl=0)
+
+    resultado = operacoes(etl)
+    assert len(resultado) == 12
+    assert resultado['DF-0-0'] == 5000.0
+    assert 'GO-1-2' not in resultado and 'GO-novo' in resultado
+    # Ligações antigas da operação alterada foram trocadas pelas novas
+    assert consultar(etl, "SELECT GROUP_CONCAT(rel.id_eixo) FROM operacao_eixo_rel rel "
+                          "JOIN operacoes op ON op.sk_operacao = rel.sk_operacao "
+                          "WHERE op.id_operacao = 'DF-0-0'") == '2'
+    assert consultar(etl, "SELECT COUNT(*) FROM operacao_eixo_rel") == 12
+    assert consultar(etl, "SELECT num_operacoes FROM resumo_kpis") == 12
+
+
+def test_remocao_so_nas_ufs_com_extracao_completa(etl, tmp_path):
+    paginas = {'DF': paginas_de('DF', 2), 'GO': paginas_de('GO', 2)}
+    with ServidorFalso(paginas) as servidor:
+        executar(etl, servidor, tmp_path / 'cache')
+
+    # Cache novo em que a extração de GO para na página 1: as operações dela não podem sumir
+    paginas['DF'][1].pop()
+    with ServidorFalso(paginas, {('GO', 1): [(500, None)]}) as servidor:
+        executar(etl, servidor, tmp_path / 'cache_novo')
+
+    resultado = operacoes(etl)
+    assert 'DF-1-2' not in resultado
+    assert {f'GO-1-{i}' for i in range(3)} <= resultado.keys()
+    assert len(resultado) == 11
+
+
+def test_versao_muda_so_quando_os_dados_mudam(etl, api, tmp_path, monkeypatch):
+    assert executar(etl, api, tmp_path / 'cache')[0] == 1
+    assert executar(etl, api, tmp_path / 'cache')[0] == 1
+
+    # Uma falha depois dos lotes desfaz a carga inteira: nem dados nem versão novos
+    api.paginas['DF'][0][0] = projeto('DF-0-0', 'DF', valor=5000.0)
+
+    def falhar(*args, **kwargs):
+        raise RuntimeError("falha nos resumos")
+
+    with monkeypatch.context() as m:
+        m.setattr(processa_dados, 'atualizar_resumos', falhar)
+        with pytest.raises(RuntimeError):
+            executar(etl, api, tmp_path / 'cache', ttl=0)
+    assert operacoes(etl)['DF-0-0'] == 1000.0
+    with etl.connect() as conn:
+        assert versao_atual(conn) == 1
+
+    assert executar(etl, api, tmp_path / 'cache')[0] == 2
+    assert operacoes(etl)['DF-0-0'] == 5000.0
+
+    # Publicação interrompida (execução pendente em etl_runs): a próxima carga gera outra versão
+    with etl.begin() as conn:
+        iniciar_execucao(conn, 'swap', datetime.now())
+    assert executar(etl, api, tmp_path / 'cache')[0] == 4
+    assert executar(etl, api, tmp_path / 'cache')[0] == 4
+
+
+def test_staging_reaproveitado_so_com_as_chaves_do_banco(etl, api, tmp_path):
+    assert executar(etl, api, tmp_path / 'cache')[1] is False
+    assert executar(etl, api, tmp_path / 'cache')[1] is True
+
+    # Chave inteira diferente da do staging (ex.: o banco foi recarregado por outro staging)
+    with etl.begin() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        conn.execute(text("UPDATE operacoes SET sk_operacao = sk_operacao + 1000 WHERE id_operacao = 'DF-0-0'"))
+    fontes = processa_dados.get_data_from_api_or_cache(['DF', 'GO'], cache_dir=str(tmp_path / 'cache'),
+                                                       somente_cache=True)
+    estado = processa_dados.preparar_upsert(etl)
+    assert not Staging(processa_dados.STAGING_DIR).chaves_compativeis(estado)
+    assert processa_dados.normalizar(fontes, estado)[1] is False
+
+
+def test_paginas_inalteradas_nao_sao_normalizadas(etl, api, tmp_path):
+    executar(etl, api, tmp_path / 'cache')
+
+    api.paginas['GO'][1][0] = projeto('GO-1-0', 'GO', valor=7000.0)
+    executar(etl, api, tmp_path / 'cache', ttl=0)
+
+    staging = Staging(processa_dados.STAGING_DIR)
+    assert staging.incremental
+    assert staging.manifesto['linhas']['operacoes'] == 3
+    assert len(staging.ids_inalterados()) == 9
+    assert all(api.contagem(uf, pagina) == 2 for uf in ('DF', 'GO') for pagina in range(2))
+
+    resultado = operacoes(etl)
+    assert len(resultado) == 12
+    assert resultado['GO-1-0'] == 7000.0
+
+
+def test_carregador_bulk_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'carga.db'}")
+    metadata.create_all(engine)
+    carregador = CarregadorBulk(engine, metodo='auto', tamanho_lote=2)
+    assert carregador.metodo == 'executemany'
+
+    with carregador.sessao():
+        carregador.carregar('eixos', pd.DataFrame({'id_eixo': [1, 2, 3], 'descricao_eixo': ['A', 'B', 'C']}))
+        # Inteiro com nulo chega como float e volta a ser inteiro
+        carregador.carregar('tipos', pd.DataFrame({'id_tipo': [10, 11], 'descricao_tipo': ['T', 'U'],
+                                                   'id_eixo': [1.0, None]}))
+        carregador.carregar('eixos', pd.DataFrame({'id_eixo': [2, 4], 'descricao_eixo': ['B2', 'D']}), upsert=True)
+        carregador.excluir('eixos', 'id_eixo', [1, 3])
+
+    with pytest.raises(RuntimeError):
+        with carregador.sessao():
+            carregador.carregar('eixos', pd.DataFrame({'id_eixo': [5], 'descricao_eixo': ['E']}))
+            raise RuntimeError("falha no meio da carga")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id_eixo, descricao_eixo FROM eixos ORDER BY id_eixo")).all() == [
+            (2, 'B2'), (4, 'D')]
+        assert conn.execute(text("SELECT id_tipo, id_eixo FROM tipos ORDER BY id_tipo")).all() == [
+            (10, 1), (11, None)]
+    relatorio = carregador.relatorio().set_index('tabela')
+    assert relatorio.loc['eixos', 'linhas'] == 6
+    engine.dispose()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from agendador import AgendadorUFs
+from api_falsa import ServidorFalso, limitador_rapido, paginas_de
+from extracao import ExtratorPaginas
+
+
+def test_paginas_entregues_em_ordem():
+    with ServidorFalso({'DF': paginas_de('DF', 12)}) as servidor:
+        extrator = ExtratorPaginas(uf='DF', url=servidor.url, max_concorrencia=4, limitador=limitador_rapido())
+        resultado = list(extrator.iter_paginas())
+
+    assert [pagina for pagina, _ in resultado] == list(range(12))
+    assert [conteudo[0]['idUnico'] for _, conteudo in resultado] == [f'DF-{p}-0' for p in range(12)]
+    assert extrator.ultima_pagina == 12
+
+
+def test_retry_after_e_respeitado():
+    recusas = {('DF', 1): [(429, 1)]}
+    with ServidorFalso({'DF': paginas_de('DF', 3)}, recusas) as servidor:
+        extrator = ExtratorPaginas(uf='DF', url=servidor.url, max_concorrencia=1, limitador=limitador_rapido())
+        paginas = [pagina for pagina, _ in extrator.iter_paginas()]
+        tentativas = [t for uf, p, t in servidor.requisicoes if p == 1]
+
+    assert paginas == [0, 1, 2]
+    assert len(tentativas) == 2
+    assert tentativas[1] - tentativas[0] >= 0.95
+
+
+def test_limite_de_recusas_encerra_a_extracao():
+    recusas = {('DF', 0): [(503, 0)] * 100}
+    with ServidorFalso({'DF': paginas_de('DF', 3)}, recusas) as servidor:
+        extrator = ExtratorPaginas(uf='DF', url=servidor.url, max_concorrencia=1,
+                                   limitador=limitador_rapido(), max_limites=3)
+        resultado = list(extrator.iter_paginas())
+
+        assert resultado == []
+        assert extrator.ultima_pagina is None
+        assert servidor.contagem('DF', 0) == 3
+
+
+@pytest.mark.parametrize('max_ufs_paralelas', [1, 2])
+def test_agendador_usa_a_url_configurada(tmp_path, max_ufs_paralelas):
+    paginas = {'DF': paginas_de('DF', 4), 'GO': paginas_de('GO', 2)}
+    with ServidorFalso(paginas, {('GO', 1): [(429, 0)]}) as servidor:
+        agendador = AgendadorUFs(['DF', 'GO'], str(tmp_path), max_ufs_paralelas=max_ufs_paralelas,
+                                 limitador=limitador_rapido(), url=servidor.url)
+        progresso = agendador.executar()
+
+    assert {uf: estado['status'] for uf, estado in progresso.items()} == {'DF': 'completo', 'GO': 'completo'}
+    assert agendador.completo
+    ids = [registro['idUnico'] for registro in agendador.iter_registros()]
+    assert ids == [r['idUnico'] for uf in ('DF', 'GO') for pagina in paginas[uf] for r in pagina]